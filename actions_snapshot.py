@@ -0,0 +1,222 @@
+"""Columnar snapshot of products and user_actions for offline jobs.
+
+Dumps one ``.npy`` file per column plus ``manifest.json`` into a directory.
+userId / productId / category / action are dictionary-encoded to integer
+codes (-1 = missing), timestamps are int64 milliseconds since the epoch,
+and actions are ordered by (userId, timestamp) so every user is one
+contiguous run. Loading memory-maps the columns, so re-running the
+evaluator or the neighbour builder no longer scans the primary.
+
+    python -m actions_snapshot --out snapshots/today
+    python -m reco_test --snapshot snapshots/today
+    python -m item_neighbors --snapshot snapshots/today
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from array import array
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.db import actions_coll, products_coll
+from app.models import ActionEnum
+
+FORMAT_VERSION = 1
+MISSING = -1
+MISSING_TS = np.iinfo(np.int64).min
+
+ACTIONS = [a.value for a in ActionEnum]
+
+_COLUMNS = {
+    "user": np.int32,
+    "product": np.int32,
+    "category": np.int32,
+    "action": np.int8,
+    "timestamp": np.int64,
+    "product_category": np.int32,
+}
+
+
+class _Dictionary:
+    def __init__(self):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+
+    def code(self, value: Optional[str]) -> int:
+        if not value:
+            return MISSING
+        c = self.codes.get(value)
+        if c is None:
+            c = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return c
+
+
+def _ms(ts) -> int:
+    if not isinstance(ts, datetime):
+        return MISSING_TS
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return int(ts.timestamp() * 1000)
+
+
+def _save_strings(path: str, values: List[str]) -> None:
+    # fixed-width unicode keeps the dictionary mmap-able
+    np.save(path, np.array(values, dtype=f"<U{max((len(v) for v in values), default=1)}"))
+
+
+async def dump(out_dir: str, batch_size: int) -> dict:
+    started = time.perf_counter()
+    os.makedirs(out_dir, exist_ok=True)
+
+    users = _Dictionary()
+    products = _Dictionary()
+    categories = _Dictionary()
+    action_codes = {a: i for i, a in enumerate(ACTIONS)}
+
+    product_category = array("i")
+    async for p in products_coll.find({}, {"category": 1}).batch_size(batch_size):
+        products.code(str(p["_id"]))
+        product_category.append(categories.code(p.get("category")))
+    n_products = len(products.values)
+
+    cols = {name: array("q" if dtype == np.int64 else "i") for name, dtype in _COLUMNS.items() if name != "product_category"}
+
+    def emit(rows: List[dict]) -> None:
+        # the cursor walks the (userId, timestamp desc) index; flip each user
+        for a in reversed(rows):
+            cols["user"].append(users.code(a["userId"]))
+            cols["product"].append(products.code(a.get("productId")))
+            cols["category"].append(categories.code(a.get("category")))
+            cols["action"].append(action_codes.get(a.get("action"), MISSING))
+            cols["timestamp"].append(_ms(a.get("timestamp")))
+
+    cursor = actions_coll.find(
+        {"userId": {"$nin": [None, ""]}},
+        {"_id": 0, "userId": 1, "productId": 1, "category": 1, "action": 1, "timestamp": 1},
+    ).sort([("userId", 1), ("timestamp", -1)]).batch_size(batch_size)
+
+    current = None
+    rows: List[dict] = []
+    async for a in cursor:
+        if a["userId"] != current:
+            emit(rows)
+            current, rows = a["userId"], []
+        rows.append(a)
+    emit(rows)
+
+    cols["product_category"] = product_category
+    files = {}
+    for name, dtype in _COLUMNS.items():
+        np.save(os.path.join(out_dir, f"{name}.npy"), np.asarray(cols[name]).astype(dtype, copy=False))
+        files[name] = f"{name}.npy"
+    for name, d in (("users", users), ("products", products), ("categories", categories)):
+        _save_strings(os.path.join(out_dir, f"{name}.npy"), d.values)
+        files[name] = f"{name}.npy"
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "created_at": datetime.utcnow().isoformat(),
+        "actions": ACTIONS,
+        "counts": {
+            "actions": len(cols["user"]),
+            "users": len(users.values),
+            "products": len(products.values),
+            "catalog_products": n_products,
+            "categories": len(categories.values),
+        },
+        "files": files,
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+    }
+    with open(os.path.join(out_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+class Snapshot:
+    """Memory-mapped view of a snapshot directory written by ``dump``.
+
+    ``products`` lists catalog products first (``catalog_products`` of
+    them, with ``product_category``), then ids only seen in actions.
+    """
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"unsupported snapshot format: {self.manifest.get('format_version')}")
+        self.path = path
+        cols = {name: np.load(os.path.join(path, file), mmap_mode="r") for name, file in self.manifest["files"].items()}
+        self.user = cols["user"]
+        self.product = cols["product"]
+        self.category = cols["category"]
+        self.action = cols["action"]
+        self.timestamp = cols["timestamp"]
+        self.product_category = cols["product_category"]
+        self.users = cols["users"]
+        self.products = cols["products"]
+        self.categories = cols["categories"]
+        self.actions: List[str] = self.manifest["actions"]
+        self.catalog_products: int = self.manifest["counts"]["catalog_products"]
+
+    def __len__(self) -> int:
+        return len(self.user)
+
+    def catalog(self) -> Tuple[List[str], List[Optional[str]]]:
+        """Product ids and categories of the catalog, in dump order."""
+        ids = self.products[: self.catalog_products].tolist()
+        categories = self.categories.tolist()
+        return ids, [categories[c] if c != MISSING else None for c in self.product_category.tolist()]
+
+    def positive_counts(self, positive: Iterable[str]) -> np.ndarray:
+        """Number of ``positive`` actions per product code."""
+        codes = [self.actions.index(a) for a in positive if a in self.actions]
+        mask = np.isin(self.action, codes) & (self.product != MISSING)
+        return np.bincount(self.product[mask], minlength=len(self.products))
+
+    def user_bounds(self) -> np.ndarray:
+        """Start offsets of each user's run, with ``len(self)`` appended."""
+        if len(self) == 0:
+            return np.zeros(1, dtype=np.int64)
+        starts = np.flatnonzero(np.diff(self.user)) + 1
+        return np.concatenate(([0], starts, [len(self)])).astype(np.int64)
+
+    def iter_users(self) -> Iterator[Tuple[str, List[Tuple[Optional[str], Optional[str], Optional[str]]]]]:
+        """Yield ``(userId, [(productId, category, action), ...])`` in time order."""
+        users = self.users.tolist()
+        products = self.products.tolist()
+        categories = self.categories.tolist()
+        actions = self.actions
+        bounds = self.user_bounds()
+        for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+            p = self.product[start:end].tolist()
+            c = self.category[start:end].tolist()
+            a = self.action[start:end].tolist()
+            yield users[self.user[start]], [
+                (
+                    products[pi] if pi != MISSING else None,
+                    categories[ci] if ci != MISSING else None,
+                    actions[ai] if ai != MISSING else None,
+                )
+                for pi, ci, ai in zip(p, c, a)
+            ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Dump products and user_actions to a columnar snapshot")
+    parser.add_argument("--out", required=True, help="output directory")
+    parser.add_argument("--batch-size", type=int, default=10000, help="cursor batch size")
+    args = parser.parse_args()
+
+    manifest = asyncio.run(dump(args.out, args.batch_size))
+    for key, value in manifest["counts"].items():
+        print(f"{key:18s} {value}")
+    print(f"{'elapsed_seconds':18s} {manifest['elapsed_seconds']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+from app.models import UserInDB
+from .config import settings
+
+
+class AuthCache:
+    """TTL + LRU cache of recently verified Basic credentials.
+
+    Keys are (username, HMAC of the password under a per-process secret), so
+    plain passwords are never held in memory and a changed password simply
+    misses. Entries are indexed by user id for explicit invalidation.
+
+    A caller verifying a miss takes ``generation()`` before reading the user
+    and passes it to ``put``, which then skips users invalidated since: the
+    password check may have used a hash that was changed or deleted
+    meanwhile.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._secret = os.urandom(32)
+        self._entries: "OrderedDict[Tuple[str, bytes], Tuple[float, UserInDB]]" = OrderedDict()
+        self._by_user: Dict[str, Set[Tuple[str, bytes]]] = {}
+        self._generation = 0
+        # user id -> generation it was last invalidated at; the oldest are
+        # forgotten past max_entries, raising _floor to stay conservative
+        self._invalidated_at: "OrderedDict[str, int]" = OrderedDict()
+        self._floor = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    def _key(self, username: str, password: str) -> Tuple[str, bytes]:
+        digest = hmac.new(self._secret, password.encode("utf-8"), hashlib.sha256).digest()
+        return username, digest
+
+    def _drop(self, key: Tuple[str, bytes]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        user_keys = self._by_user.get(entry[1].id)
+        if user_keys is not None:
+            user_keys.discard(key)
+            if not user_keys:
+                del self._by_user[entry[1].id]
+
+    def get(self, username: str, password: str) -> Optional[UserInDB]:
+        if not self.enabled:
+            return None
+        key = self._key(username, password)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, user = entry
+            if expires_at <= now:
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return user
+
+    def generation(self) -> int:
+        with self._lock:
+            return self._generation
+
+    def put(self, username: str, password: str, user: UserInDB, generation: int) -> None:
+        if not self.enabled:
+            return
+        key = self._key(username, password)
+        with self._lock:
+            if generation < self._floor or self._invalidated_at.get(user.id, -1) > generation:
+                self.stale_puts += 1
+                return
+            self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, user)
+            self._by_user.setdefault(user.id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def invalidate_user(self, user_id: str) -> None:
+        with self._lock:
+            for key in list(self._by_user.get(user_id, ())):
+                self._drop(key)
+            self._generation += 1
+            self._invalidated_at[user_id] = self._generation
+            self._invalidated_at.move_to_end(user_id)
+            while len(self._invalidated_at) > max(self.max_entries, 1):
+                _, forgotten = self._invalidated_at.popitem(last=False)
+                self._floor = max(self._floor, forgotten)
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+            self._generation += 1
+            self._invalidated_at.clear()
+            self._floor = self._generation
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "stale_puts": self.stale_puts,
+            }
+
+
+auth_cache = AuthCache(
+    max_entries=settings.auth_cache_max_entries,
+    ttl_seconds=settings.auth_cache_ttl_seconds,
+)
@@ -0,0 +1,216 @@
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+# only types that actually shrink; images, archives, application/gzip
+# exports and the like are already compressed and pass through untouched
+COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/javascript",
+    "application/x-ndjson",
+    "application/xml",
+    "image/svg+xml",
+}
+
+
+def _available() -> List[str]:
+    names = []
+    if brotli is not None:
+        names.append("br")
+    if zstandard is not None:
+        names.append("zstd")
+    names.append("gzip")
+    return names
+
+
+def negotiate(accept_encoding: str, supported: List[str]) -> Optional[str]:
+    """Pick the best of ``supported`` for an ``Accept-Encoding`` header.
+
+    Highest q-value wins; ties go to the earlier entry in ``supported``.
+    """
+    q: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        q[name] = weight
+
+    best, best_q = None, 0.0
+    for name in supported:
+        weight = q.get(name, q.get("*", 0.0))
+        if weight > best_q:
+            best, best_q = name, weight
+    return best
+
+
+def is_compressible(content_type: str) -> bool:
+    mime = content_type.split(";", 1)[0].strip().lower()
+    return (
+        mime.startswith("text/")
+        or mime in COMPRESSIBLE_TYPES
+        or mime.endswith("+json")
+        or mime.endswith("+xml")
+    )
+
+
+class _Encoder:
+    """Incremental compressor; ``chunk`` flushes so streamed output keeps flowing."""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int, zstd_level: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._c = brotli.Compressor(quality=brotli_quality)
+        elif encoding == "zstd":
+            self._c = zstandard.ZstdCompressor(level=zstd_level).compressobj()
+        else:
+            self._c = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._c.process(data) + self._c.flush()
+        if self.encoding == "zstd":
+            return self._c.compress(data) + self._c.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return self._c.compress(data) + self._c.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._c.process(data) + self._c.finish()
+        return self._c.compress(data) + self._c.flush()
+
+
+class CompressionMiddleware:
+    """gzip / brotli / zstd response compression negotiated on ``Accept-Encoding``.
+
+    Single-body responses under ``min_size`` go out as-is. Streaming
+    responses are compressed chunk by chunk and flushed after every chunk.
+    Responses that already carry a ``Content-Encoding``, are not a text-like
+    type, are partial (206) or say ``no-transform`` are left alone. A
+    compressed response's ETag is weakened, since its bytes differ from the
+    identity body the tag was computed for.
+    """
+
+    def __init__(
+        self,
+        app,
+        min_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        zstd_level: int = 3,
+        encodings: Optional[List[str]] = None,
+    ):
+        self.app = app
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.zstd_level = zstd_level
+        available = _available()
+        self.encodings = [e for e in (encodings or available) if e in available]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        accept = ""
+        for key, value in scope["headers"]:
+            if key == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = negotiate(accept, self.encodings) if accept else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[dict] = None
+        encoder: Optional[_Encoder] = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, encoder, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                headers = {k.lower(): v for k, v in message.get("headers", [])}
+                cache_control = headers.get(b"cache-control", b"").lower()
+                if (
+                    message["status"] < 200
+                    or message["status"] in (204, 206, 304)
+                    or b"content-encoding" in headers
+                    or b"no-transform" in cache_control
+                    or not is_compressible(headers.get(b"content-type", b"").decode("latin-1"))
+                ):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start = message  # held until we see the first body chunk
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+
+            if encoder is None:
+                if not more and len(body) < self.min_size:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                encoder = _Encoder(encoding, self.gzip_level, self.brotli_quality, self.zstd_level)
+                if more:
+                    await send(_encoded_start(start, encoding, None))
+                else:
+                    data = encoder.finish(body)
+                    await send(_encoded_start(start, encoding, len(data)))
+                    await send({"type": "http.response.body", "body": data})
+                    return
+
+            data = encoder.chunk(body) if more else encoder.finish(body)
+            await send({"type": "http.response.body", "body": data, "more_body": more})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def _encoded_start(start: dict, encoding: str, length: Optional[int]) -> dict:
+    headers: List[Tuple[bytes, bytes]] = []
+    vary = None
+    for key, value in start.get("headers", []):
+        name = key.lower()
+        if name == b"content-length":
+            continue
+        if name == b"vary":
+            vary = value
+            continue
+        if name == b"etag" and not value.startswith(b"W/"):
+            value = b"W/" + value
+        headers.append((key, value))
+    headers.append((b"content-encoding", encoding.encode()))
+    if vary is None:
+        vary = b"Accept-Encoding"
+    elif b"accept-encoding" not in vary.lower():
+        vary = vary + b", Accept-Encoding"
+    headers.append((b"vary", vary))
+    if length is not None:
+        headers.append((b"content-length", str(length).encode()))
+    return {**start, "headers": headers}
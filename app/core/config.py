@@ -4,8 +4,14 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+APP_ENV = os.getenv("APP_ENV", "production").lower()
+
+# bcrypt cost per environment; BCRYPT_ROUNDS overrides it explicitly.
+_BCRYPT_ROUNDS_BY_ENV = {"production": 12, "staging": 10, "development": 6, "test": 4}
+
 
 class Settings(BaseModel):
+    app_env: str = APP_ENV
     port: int = int(os.getenv("PORT", "8080"))
 
     mongo_uri: str = os.getenv("MONGO_URI", "mongodb://localhost:27017")
@@ -14,5 +20,67 @@ class Settings(BaseModel):
     svc_username: str = os.getenv("SVC_USERNAME", "service_bot")
     svc_password: str = os.getenv("SVC_PASSWORD", "service_bot_secret")
 
+    auth_cache_ttl_seconds: float = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "300"))
+    auth_cache_max_entries: int = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+
+    bcrypt_rounds: int = int(os.getenv("BCRYPT_ROUNDS", str(_BCRYPT_ROUNDS_BY_ENV.get(APP_ENV, 12))))
+    hash_pool_kind: str = os.getenv("HASH_POOL_KIND", "thread")
+    hash_pool_workers: int = int(os.getenv("HASH_POOL_WORKERS", str(os.cpu_count() or 2)))
+    hash_pool_max_concurrency: int = int(os.getenv("HASH_POOL_MAX_CONCURRENCY", str(os.cpu_count() or 2)))
+
+    catalog_refresh_seconds: float = float(os.getenv("CATALOG_REFRESH_SECONDS", "60"))
+    catalog_change_stream: bool = os.getenv("CATALOG_CHANGE_STREAM", "true").lower() in ("1", "true", "yes")
+
+    response_cache_ttl_seconds: float = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "30"))
+    response_cache_max_entries: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+
+    view_buffer_enabled: bool = os.getenv("VIEW_BUFFER_ENABLED", "true").lower() in ("1", "true", "yes")
+    view_buffer_max_size: int = int(os.getenv("VIEW_BUFFER_MAX_SIZE", "10000"))
+    view_buffer_batch_size: int = int(os.getenv("VIEW_BUFFER_BATCH_SIZE", "500"))
+    view_buffer_flush_seconds: float = float(os.getenv("VIEW_BUFFER_FLUSH_SECONDS", "1.0"))
+    # "drop" counts and discards views when full, "block" waits for room
+    view_buffer_policy: str = os.getenv("VIEW_BUFFER_POLICY", "drop")
+
+    compression_enabled: bool = os.getenv("COMPRESSION_ENABLED", "true").lower() in ("1", "true", "yes")
+    # bodies smaller than this are not worth the CPU and go out uncompressed
+    compression_min_size: int = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+    compression_gzip_level: int = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+    compression_brotli_quality: int = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+    compression_zstd_level: int = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+    # server preference among those the client accepts equally; br/zstd need their packages
+    compression_encodings: str = os.getenv("COMPRESSION_ENCODINGS", "br,zstd,gzip")
+
+    static_dir: str = os.getenv("STATIC_DIR", "static")
+    # fingerprinted and precompressed copy of static_dir, rebuilt at startup
+    static_build_dir: str = os.getenv("STATIC_BUILD_DIR", "static_build")
+
+    export_batch_size: int = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+    export_gzip_level: int = int(os.getenv("EXPORT_GZIP_LEVEL", "6"))
+
+    bulk_batch_size: int = int(os.getenv("BULK_BATCH_SIZE", "1000"))
+    bulk_max_errors: int = int(os.getenv("BULK_MAX_ERRORS", "1000"))
+
+    popularity_half_life_hours: float = float(os.getenv("POPULARITY_HALF_LIFE_HOURS", "24"))
+    popularity_compact_seconds: float = float(os.getenv("POPULARITY_COMPACT_SECONDS", "3600"))
+    popularity_backfill: bool = os.getenv("POPULARITY_BACKFILL", "true").lower() in ("1", "true", "yes")
+
+    # how often to check for a newer offline build of product_neighbors
+    neighbors_reload_seconds: float = float(os.getenv("NEIGHBORS_RELOAD_SECONDS", "300"))
+
+    # rollups stay this far behind now so buffered view writes have landed
+    rollup_lag_seconds: float = float(os.getenv("ROLLUP_LAG_SECONDS", "120"))
+    rollup_interval_seconds: float = float(os.getenv("ROLLUP_INTERVAL_SECONDS", "300"))
+    rollup_window_hours: int = int(os.getenv("ROLLUP_WINDOW_HOURS", "168"))
+    rollup_batch_size: int = int(os.getenv("ROLLUP_BATCH_SIZE", "1000"))
+
+    # capped collection tailed by every worker to drop stale in-process caches
+    invalidation_bus_enabled: bool = os.getenv("INVALIDATION_BUS_ENABLED", "true").lower() in ("1", "true", "yes")
+    invalidation_bus_size_bytes: int = int(os.getenv("INVALIDATION_BUS_SIZE_BYTES", str(1024 * 1024)))
+    invalidation_bus_max_docs: int = int(os.getenv("INVALIDATION_BUS_MAX_DOCS", "10000"))
+    invalidation_bus_retry_seconds: float = float(os.getenv("INVALIDATION_BUS_RETRY_SECONDS", "1.0"))
+
+    # needs a replica set; falls back to a plain insert_many on standalone mongod
+    checkout_transactions: bool = os.getenv("CHECKOUT_TRANSACTIONS", "false").lower() in ("1", "true", "yes")
+
 
 settings = Settings()
@@ -1,9 +1,11 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from .config import settings
+from .metrics import mongo_listener
 
-client = AsyncIOMotorClient(settings.mongo_uri)
+client = AsyncIOMotorClient(settings.mongo_uri, event_listeners=[mongo_listener])
 db = client[settings.mongo_db]
 
 users_coll = db["users"]
 products_coll = db["products"]
 actions_coll = db["user_actions"]
+profiles_coll = db["user_profiles"]
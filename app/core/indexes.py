@@ -0,0 +1,113 @@
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+from .db import db
+
+logger = logging.getLogger(__name__)
+
+# (collection, keys, options)
+INDEX_SPECS: List[Tuple[str, List[Tuple[str, int]], Dict[str, Any]]] = [
+    ("users", [("username", ASCENDING)], {"name": "username_unique", "unique": True}),
+    ("user_actions", [("userId", ASCENDING), ("timestamp", DESCENDING)], {"name": "user_timestamp"}),
+    (
+        "user_actions",
+        [("userId", ASCENDING), ("action", ASCENDING), ("timestamp", DESCENDING)],
+        {"name": "user_action_timestamp"},
+    ),
+    (
+        "user_actions",
+        [("userId", ASCENDING), ("productId", ASCENDING), ("action", ASCENDING)],
+        {"name": "user_product_action"},
+    ),
+    ("user_actions", [("timestamp", ASCENDING)], {"name": "timestamp"}),
+    ("product_popularity", [("score", DESCENDING)], {"name": "score"}),
+    ("product_popularity", [("trend", DESCENDING)], {"name": "trend"}),
+    ("product_popularity", [("category", ASCENDING), ("score", DESCENDING)], {"name": "category_score"}),
+    ("product_popularity", [("category", ASCENDING), ("trend", DESCENDING)], {"name": "category_trend"}),
+    (
+        "action_rollups",
+        [("granularity", ASCENDING), ("dimension", ASCENDING), ("key", ASCENDING), ("bucket", ASCENDING)],
+        {"name": "series_unique", "unique": True},
+    ),
+    (
+        "action_rollups",
+        [("granularity", ASCENDING), ("dimension", ASCENDING), ("bucket", ASCENDING)],
+        {"name": "granularity_dimension_bucket"},
+    ),
+    ("products", [("category", ASCENDING)], {"name": "category"}),
+    # also the natural key for bulk upserts of rows without an id
+    ("products", [("brand", ASCENDING), ("model", ASCENDING)], {"name": "brand_model"}),
+    ("products", [("model", ASCENDING)], {"name": "model"}),
+    ("products", [("price", ASCENDING)], {"name": "price"}),
+]
+
+# Representative hot queries: (name, collection, filter, sort)
+QUERY_PROBES: List[Tuple[str, str, Dict[str, Any], Optional[List[Tuple[str, int]]]]] = [
+    ("auth: users by username", "users", {"username": ""}, None),
+    ("me_history", "user_actions", {"userId": ""}, [("timestamp", DESCENDING)]),
+    (
+        "me_purchases",
+        "user_actions",
+        {"userId": "", "action": "PURCHASE"},
+        [("timestamp", DESCENDING)],
+    ),
+    ("like_product exists", "user_actions", {"userId": "", "productId": "", "action": "LIKE"}, None),
+    ("products_by_category", "products", {"category": {"$in": ["PHONE"]}}, None),
+    ("products_by_brand", "products", {"brand": ""}, None),
+    ("products_by_model", "products", {"model": ""}, None),
+    ("products_by_price", "products", {"price": {"$gte": 0, "$lte": 0}}, None),
+]
+
+last_report: List[Dict[str, Any]] = []
+
+
+async def ensure_indexes() -> List[str]:
+    created: List[str] = []
+    for coll_name, keys, options in INDEX_SPECS:
+        try:
+            created.append(await db[coll_name].create_index(keys, **options))
+        except OperationFailure as e:
+            # e.g. duplicate usernames already present for the unique index
+            logger.error("index %s.%s not created: %s", coll_name, options.get("name"), e)
+    return created
+
+
+def _plan_stages(plan: Any) -> List[str]:
+    stages: List[str] = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(_plan_stages(item))
+    return stages
+
+
+async def report_collection_scans() -> List[Dict[str, Any]]:
+    report: List[Dict[str, Any]] = []
+    for name, coll_name, query, sort in QUERY_PROBES:
+        cursor = db[coll_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        try:
+            explained = await cursor.explain()
+        except Exception as e:
+            report.append({"query": name, "collection": coll_name, "error": str(e)})
+            continue
+
+        winning = explained.get("queryPlanner", {}).get("winningPlan", {})
+        stages = _plan_stages(winning)
+        collscan = "COLLSCAN" in stages
+        report.append(
+            {"query": name, "collection": coll_name, "stages": stages, "collscan": collscan}
+        )
+        if collscan:
+            logger.warning("query %r on %s still does a collection scan", name, coll_name)
+
+    last_report[:] = report
+    return report
@@ -0,0 +1,235 @@
+import math
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from pymongo import monitoring
+
+# seconds; roughly Prometheus' defaults with a finer low end
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_str(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        # observations come from pool threads and pymongo's listener threads too
+        self._lock = threading.Lock()
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [f"{self.name}{_label_str(self.labelnames, k)} {_num(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [bucket counts..., +Inf count], sum
+        self._series: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = 0
+        buckets = self.buckets
+        while i < len(buckets) and value > buckets[i]:
+            i += 1
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = ([0] * (len(buckets) + 1), [0.0])
+            series[0][i] += 1
+            series[1][0] += value
+
+    @contextmanager
+    def time(self, *labels: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(c), s[0])) for k, (c, s) in self._series.items())
+        lines = self._header()
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_num(bound)}"'
+                lines.append(f"{self.name}_bucket{_label_str(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_str(self.labelnames, labels)} {_num(total)}")
+            lines.append(f"{self.name}_count{_label_str(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+http_request_seconds = Histogram(
+    "daystore_http_request_seconds", "HTTP request latency by route template", ("method", "route")
+)
+http_requests_total = Counter(
+    "daystore_http_requests_total", "HTTP requests by route template and status", ("method", "route", "status")
+)
+http_in_flight = Gauge("daystore_http_requests_in_flight", "HTTP requests currently being served", ("method",))
+mongo_command_seconds = Histogram(
+    "daystore_mongo_command_seconds", "MongoDB command latency by collection and command", ("collection", "command")
+)
+mongo_command_failures = Counter(
+    "daystore_mongo_command_failures_total", "Failed MongoDB commands", ("collection", "command")
+)
+password_seconds = Histogram(
+    "daystore_password_seconds", "bcrypt hash/verify time including hash pool wait", ("op",)
+)
+
+REGISTRY: List[_Metric] = [
+    http_request_seconds,
+    http_requests_total,
+    http_in_flight,
+    mongo_command_seconds,
+    mongo_command_failures,
+    password_seconds,
+]
+
+
+class MetricsMiddleware:
+    """Times every HTTP request and labels it with the matched route template.
+
+    FastAPI puts the matched ``APIRoute`` into ``scope["route"]`` during
+    routing, so the label is ``/api/v1/products/{product_id}`` rather than
+    the raw path; anything that is not an API route (static files, 404s)
+    is labelled ``other``. Latency is measured up to the last body chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_in_flight.inc(method)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_flight.dec(method)
+            route = getattr(scope.get("route"), "path", None) or "other"
+            http_request_seconds.observe(time.perf_counter() - started, method, route)
+            http_requests_total.inc(method, route, str(status))
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """pymongo command listener feeding per-collection/command timings."""
+
+    def __init__(self):
+        self._collections: Dict[Tuple, str] = {}
+
+    @staticmethod
+    def _key(event) -> Tuple:
+        return (event.connection_id, event.request_id)
+
+    def started(self, event) -> None:
+        target = event.command.get(event.command_name)
+        if not isinstance(target, str):
+            target = event.command.get("collection", "")  # getMore
+        self._collections[self._key(event)] = target if isinstance(target, str) else ""
+
+    def succeeded(self, event) -> None:
+        collection = self._collections.pop(self._key(event), "")
+        mongo_command_seconds.observe(event.duration_micros / 1e6, collection, event.command_name)
+
+    def failed(self, event) -> None:
+        collection = self._collections.pop(self._key(event), "")
+        mongo_command_seconds.observe(event.duration_micros / 1e6, collection, event.command_name)
+        mongo_command_failures.inc(collection, event.command_name)
+
+
+mongo_listener = MongoCommandMetrics()
+
+
+def _flatten(prefix: str, stats: dict) -> Iterable[Tuple[str, float]]:
+    for key, value in stats.items():
+        name = re.sub(r"[^a-zA-Z0-9_]", "_", f"{prefix}_{key}")
+        if isinstance(value, bool):
+            yield name, float(value)
+        elif isinstance(value, (int, float)):
+            yield name, value
+        elif isinstance(value, dict):
+            yield from _flatten(name, value)
+
+
+def render(components: Optional[Dict[str, Callable[[], dict]]] = None) -> str:
+    """Prometheus text exposition of the registry plus numeric ``stats()`` gauges."""
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    for component, stats in (components or {}).items():
+        for name, value in _flatten(f"daystore_{component}", stats()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {_num(float(value))}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,62 @@
+import base64
+import json
+from bisect import bisect_right
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from bson import ObjectId
+from fastapi import HTTPException
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def id_sort_key(_id: Any) -> Tuple:
+    """Sort key for ``_id`` values that follows MongoDB's BSON type order."""
+    if isinstance(_id, (int, float)) and not isinstance(_id, bool):
+        return (0, _id, "")
+    if isinstance(_id, str):
+        return (1, 0, _id)
+    if isinstance(_id, ObjectId):
+        return (2, 0, str(_id))
+    return (3, 0, str(_id))
+
+
+def encode_cursor(key: Sequence[Any]) -> str:
+    raw = json.dumps(list(key), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(key, list):
+            raise ValueError(cursor)
+        return tuple(key)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_page(
+    positions: Sequence[int],
+    sort_key: Callable[[int], Tuple],
+    cursor: Optional[str],
+    limit: int,
+) -> Tuple[List[int], Optional[str]]:
+    """Slice one page out of ``positions``, which must be ascending by ``sort_key``.
+
+    The cursor is the sort key of the last row returned, so a page stays
+    stable even if rows before it are inserted or removed in between.
+    """
+    start = 0
+    if cursor:
+        after = decode_cursor(cursor)
+        try:
+            start = bisect_right(positions, after, key=sort_key)
+        except TypeError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    page = list(positions[start:start + limit])
+    next_cursor = None
+    if page and start + limit < len(positions):
+        next_cursor = encode_cursor(sort_key(page[-1]))
+    return page, next_cursor
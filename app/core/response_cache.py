@@ -0,0 +1,103 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+from fastapi import Request, Response
+
+from .config import settings
+
+
+class CachedBody:
+    __slots__ = ("body", "etag", "expires_at")
+
+    def __init__(self, body: bytes, ttl_seconds: float):
+        self.body = body
+        self.etag = '"%s"' % hashlib.blake2b(body, digest_size=12).hexdigest()
+        self.expires_at = time.monotonic() + ttl_seconds
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [t.strip() for t in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or ("W/" + etag) in candidates
+
+
+class ResponseCache:
+    """Pre-serialized JSON response bodies with TTL, LRU bound and ETags."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, CachedBody]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+
+    def get(self, key: str) -> Optional[CachedBody]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, body: bytes) -> CachedBody:
+        entry = CachedBody(body, self.ttl_seconds)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, prefix: str = "") -> None:
+        if prefix:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+        else:
+            self._entries.clear()
+        self.invalidations += 1
+
+    async def serve(
+        self,
+        request: Request,
+        key: str,
+        build: Callable[[], Awaitable[bytes]],
+    ) -> Response:
+        entry = self.get(key)
+        status = "HIT"
+        if entry is None:
+            status = "MISS"
+            entry = self.put(key, await build())
+
+        if status == "HIT":
+            self.hits += 1
+        else:
+            self.misses += 1
+
+        headers = {"ETag": entry.etag, "X-Cache": status, "Cache-Control": "no-cache"}
+        if _etag_matches(request.headers.get("If-None-Match"), entry.etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "invalidations": self.invalidations,
+        }
+
+
+response_cache = ResponseCache(
+    max_entries=settings.response_cache_max_entries,
+    ttl_seconds=settings.response_cache_ttl_seconds,
+)
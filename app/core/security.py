@@ -4,9 +4,20 @@ from fastapi import Depends, HTTPException, Request, status
 from passlib.context import CryptContext
 from .db import users_coll
 from app.models import UserInDB
+from .auth_cache import auth_cache
 from .config import settings
+from .metrics import password_seconds
+from .workers import hash_pool
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.bcrypt_rounds,
+)
+
+
+def _is_bcrypt(hashed: str) -> bool:
+    return hashed.startswith("$2a$") or hashed.startswith("$2b$") or hashed.startswith("$2y$")
 
 
 def hash_password(password: str) -> str:
@@ -14,11 +25,23 @@ def hash_password(password: str) -> str:
 
 
 def verify_password(plain: str, hashed: str) -> bool:
-    if hashed.startswith("$2a$") or hashed.startswith("$2b$") or hashed.startswith("$2y$"):
+    if _is_bcrypt(hashed):
         return pwd_context.verify(plain, hashed)
     return plain == hashed
 
 
+async def hash_password_async(password: str) -> str:
+    with password_seconds.time("hash"):
+        return await hash_pool.run(hash_password, password)
+
+
+async def verify_password_async(plain: str, hashed: str) -> bool:
+    if not _is_bcrypt(hashed):
+        return plain == hashed
+    with password_seconds.time("verify"):
+        return await hash_pool.run(verify_password, plain, hashed)
+
+
 async def _find_user_by_username(username: str) -> Optional[UserInDB]:
     doc = await users_coll.find_one({"username": username})
     if not doc:
@@ -47,13 +70,19 @@ async def get_current_user(request: Request) -> UserInDB:
             detail="Invalid Authorization header"
         )
 
+    cached = auth_cache.get(username, password)
+    if cached:
+        return cached
+
+    generation = auth_cache.generation()
     user = await _find_user_by_username(username)
-    if not user or not verify_password(password, user.password):
+    if not user or not await verify_password_async(password, user.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid username or password"
         )
 
+    auth_cache.put(username, password, user, generation)
     return user
 
 
@@ -64,6 +93,6 @@ async def ensure_service_user():
 
     doc = {
         "username": settings.svc_username,
-        "password": hash_password(settings.svc_password),
+        "password": await hash_password_async(settings.svc_password),
     }
     await users_coll.insert_one(doc)
\ No newline at end of file
@@ -0,0 +1,160 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+from typing import Dict, FrozenSet
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+from .compression import brotli, is_compressible, negotiate
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+FINGERPRINTED = (".js", ".css")
+VARIANTS = {"br": ".br", "gzip": ".gz"}
+
+# root-relative references in HTML: href="/styles.css", src="/common.js"
+_HTML_REF_RE = re.compile(r"""((?:href|src)=["'])/([\w.-]+)(["'])""")
+# relative ES module imports: from "./common.js", import("./common.js")
+_JS_IMPORT_RE = re.compile(r"""((?:\bfrom|\bimport)\s*\(?\s*["'])\./([\w.-]+\.js)(["'])""")
+_HASHED_RE = re.compile(r"\.[0-9a-f]{12}\.(?:js|css)(?:\.gz|\.br)?$")
+
+
+def _write(path: str, data: bytes) -> None:
+    try:
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return
+    except FileNotFoundError:
+        pass
+    # every worker builds at startup; replace atomically so none serves a torn file
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _media_type(path: str) -> str:
+    return mimetypes.guess_type(path)[0] or "text/plain"
+
+
+class AssetFiles(StaticFiles):
+    """``StaticFiles`` over a fingerprinted, precompressed copy of ``src``.
+
+    ``build`` writes ``src`` into ``out``. Every ``.js``/``.css`` file also
+    gets a content-hashed copy (``common.3f9a0c1b2d4e.js``), relative JS
+    imports and root-relative HTML references are rewritten to the hashed
+    names, and text files of at least ``min_size`` bytes get ``.gz`` and
+    (with brotli installed) ``.br`` siblings. Hashed names are served as
+    ``immutable``; HTML and original names are ``no-cache``, so a deploy is
+    picked up on the next page load. A precompressed sibling is sent as-is
+    when the client accepts it. Hashed files from earlier builds are kept
+    for pages that are still open.
+    """
+
+    def __init__(self, src: str, out: str, min_size: int):
+        super().__init__(directory=out, html=True, check_dir=False)
+        self.src = src
+        self.out = out
+        self.min_size = min_size
+        self.manifest: Dict[str, str] = {}
+        self.encodings = [e for e in VARIANTS if e != "br" or brotli is not None]
+
+    def build(self) -> Dict[str, str]:
+        sources: Dict[str, bytes] = {}
+        for name in sorted(os.listdir(self.src)):
+            path = os.path.join(self.src, name)
+            if os.path.isfile(path):
+                with open(path, "rb") as f:
+                    sources[name] = f.read()
+
+        manifest: Dict[str, str] = {}
+        rewritten: Dict[str, bytes] = {}
+
+        def fingerprint(name: str, visiting: FrozenSet[str]) -> str:
+            # a module's hash covers the hashed names of what it imports
+            if name in manifest:
+                return manifest[name]
+            data = sources[name]
+            if name.endswith(".js"):
+                def ref(m):
+                    dep = m.group(2)
+                    if dep in sources and dep not in visiting:
+                        dep = fingerprint(dep, visiting | {name})
+                    return f"{m.group(1)}./{dep}{m.group(3)}"
+
+                data = _JS_IMPORT_RE.sub(ref, data.decode("utf-8")).encode("utf-8")
+            stem, ext = os.path.splitext(name)
+            manifest[name] = f"{stem}.{hashlib.blake2b(data, digest_size=6).hexdigest()}{ext}"
+            rewritten[name] = data
+            return manifest[name]
+
+        for name in sources:
+            if name.endswith(FINGERPRINTED):
+                fingerprint(name, frozenset())
+
+        outputs: Dict[str, bytes] = {}
+        for name, data in sources.items():
+            if name.endswith(".html"):
+                html = data.decode("utf-8")
+                html = _HTML_REF_RE.sub(lambda m: f"{m.group(1)}/{manifest.get(m.group(2), m.group(2))}{m.group(3)}", html)
+                data = html.encode("utf-8")
+            data = rewritten.get(name, data)
+            outputs[name] = data
+            if name in manifest:
+                outputs[manifest[name]] = data
+
+        os.makedirs(self.out, exist_ok=True)
+        written = {"manifest.json"}
+        for name, data in outputs.items():
+            path = os.path.join(self.out, name)
+            _write(path, data)
+            written.add(name)
+            if len(data) >= self.min_size and is_compressible(_media_type(name)):
+                _write(path + ".gz", gzip.compress(data, 9, mtime=0))
+                written.add(name + ".gz")
+                if brotli is not None:
+                    _write(path + ".br", brotli.compress(data, quality=11))
+                    written.add(name + ".br")
+        _write(os.path.join(self.out, "manifest.json"), json.dumps(manifest, indent=2, sort_keys=True).encode())
+
+        # drop anything unhashed this build did not produce (deleted sources,
+        # variants of files that shrank below min_size)
+        for name in os.listdir(self.out):
+            if name not in written and not name.endswith(".tmp") and not _HASHED_RE.search(name):
+                os.remove(os.path.join(self.out, name))
+
+        self.manifest = manifest
+        return manifest
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        name = os.path.basename(full_path)
+        headers = {"Cache-Control": IMMUTABLE if _HASHED_RE.search(name) else "no-cache"}
+
+        response = None
+        if os.path.isfile(f"{full_path}.gz"):
+            headers["Vary"] = "Accept-Encoding"
+            accept = request_headers.get("accept-encoding", "")
+            encoding = negotiate(accept, self.encodings) if accept else None
+            variant = f"{full_path}{VARIANTS[encoding]}" if encoding else None
+            if variant and os.path.isfile(variant):
+                headers["Content-Encoding"] = encoding
+                response = FileResponse(
+                    variant,
+                    status_code=status_code,
+                    headers=headers,
+                    media_type=_media_type(name),
+                    stat_result=os.stat(variant),
+                )
+        if response is None:
+            response = FileResponse(
+                full_path, status_code=status_code, headers=headers, media_type=_media_type(name), stat_result=stat_result
+            )
+
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -0,0 +1,93 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from .config import settings
+
+
+class BoundedPool:
+    """Runs blocking callables off the event loop with a concurrency cap.
+
+    Callers beyond ``max_concurrency`` wait on a semaphore instead of piling
+    up inside the executor; the number of such waiters is the queue depth.
+    """
+
+    def __init__(self, name: str, kind: str, workers: int, max_concurrency: int):
+        self.name = name
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.max_concurrency = max(1, max_concurrency)
+        self._executor: Optional[Executor] = None
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.in_flight = 0
+        self.queued = 0
+        self.max_queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix=self.name
+                )
+        return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        enqueued_at = time.perf_counter()
+        self.queued += 1
+        self.max_queued = max(self.max_queued, self.queued)
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+
+        started_at = time.perf_counter()
+        self.wait_seconds += started_at - enqueued_at
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._get_executor(), fn, *args)
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self.run_seconds += time.perf_counter() - started_at
+            self._semaphore.release()
+
+        self.completed += 1
+        return result
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        done = self.completed + self.failed
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_wait_ms": round(1000 * self.wait_seconds / done, 3) if done else 0.0,
+            "avg_run_ms": round(1000 * self.run_seconds / done, 3) if done else 0.0,
+        }
+
+
+hash_pool = BoundedPool(
+    name="hash",
+    kind=settings.hash_pool_kind,
+    workers=settings.hash_pool_workers,
+    max_concurrency=settings.hash_pool_max_concurrency,
+)
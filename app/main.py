@@ -1,17 +1,29 @@
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 import uvicorn
 
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.staticfiles import StaticFiles
 
+from app.core.compression import CompressionMiddleware
 from app.core.config import settings
+from app.core.indexes import ensure_indexes, report_collection_scans
+from app.core.metrics import MetricsMiddleware
+from app.core.static_assets import AssetFiles
 from app.core.security import ensure_service_user
-from app.routers import health, users, products, categories, search
+from app.core.workers import hash_pool
+from app.services.catalog import catalog
+from app.services.event_buffer import view_buffer
+from app.services.invalidation import invalidation_bus
+from app.services.neighbors import neighbor_index
+from app.services.popularity import popularity
+from app.services.rollups import rollups
+from app.routers import health, users, products, categories, search, export, metrics, analytics
 
 
 app = FastAPI(
     title="DayStore Backend (FastAPI)",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
 )
 
 app.add_middleware(
@@ -19,20 +31,58 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+if settings.compression_enabled:
+    app.add_middleware(
+        CompressionMiddleware,
+        min_size=settings.compression_min_size,
+        gzip_level=settings.compression_gzip_level,
+        brotli_quality=settings.compression_brotli_quality,
+        zstd_level=settings.compression_zstd_level,
+        encodings=[e.strip() for e in settings.compression_encodings.split(",") if e.strip()],
+    )
+app.add_middleware(MetricsMiddleware)
+
+assets = AssetFiles(settings.static_dir, settings.static_build_dir, min_size=settings.compression_min_size)
 
 
 @app.on_event("startup")
 async def on_startup():
+    assets.build()
+    await ensure_indexes()
+    await report_collection_scans()
     await ensure_service_user()
+    await catalog.start()
+    if settings.view_buffer_enabled:
+        await view_buffer.start()
+    await popularity.start()
+    await neighbor_index.start()
+    await rollups.start()
+    await invalidation_bus.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await invalidation_bus.stop()
+    await rollups.stop()
+    await neighbor_index.stop()
+    await popularity.stop()
+    await view_buffer.stop()
+    await catalog.stop()
+    hash_pool.shutdown()
+
 
 app.include_router(health.router)
 app.include_router(users.router)
 app.include_router(products.router)
 app.include_router(categories.router)
 app.include_router(search.router)
+app.include_router(export.router)
+app.include_router(metrics.router)
+app.include_router(analytics.router)
 
-app.mount("/", StaticFiles(directory="static", html=True), name="static")
+app.mount("/", assets, name="static")
 
 
 if __name__ == "__main__":
@@ -47,6 +47,10 @@ class ProductOut(ProductIn):
     id: str
 
 
+class ProductBulkIn(ProductIn):
+    id: Optional[str] = None
+
+
 class UserActionOut(BaseModel):
     id: Optional[str] = None
     userId: str
@@ -59,6 +63,24 @@ class PurchaseOut(BaseModel):
     timestamp: datetime
     product: ProductOut
 
+class CheckoutItem(BaseModel):
+    productId: str
+    quantity: int = Field(1, ge=1, le=100)
+
+class CheckoutRequest(BaseModel):
+    items: List[CheckoutItem] = Field(..., min_length=1, max_length=500)
+
+class CheckoutItemResult(BaseModel):
+    productId: str
+    quantity: int
+    status: str
+    product: Optional[ProductOut] = None
+
+class CheckoutOut(BaseModel):
+    purchased: int
+    failed: int
+    items: List[CheckoutItemResult]
+
 class UserPasswordUpdate(BaseModel):
     old_password: str
     new_password: str
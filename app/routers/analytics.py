@@ -0,0 +1,63 @@
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+
+from app.core.security import get_current_user
+from app.models import ActionEnum, UserInDB
+from app.routers.users import _require_admin
+from app.services.rollups import rollups
+
+router = APIRouter(prefix="/api/v1/analytics", tags=["analytics"])
+
+_GRANULARITY = Query("day", pattern="^(hour|day)$")
+
+
+@router.get("/status")
+async def rollup_status(user: UserInDB = Depends(get_current_user)):
+    _require_admin(user)
+    return {"watermark": await rollups.watermark(), **rollups.stats()}
+
+
+@router.post("/rollup")
+async def run_rollup(user: UserInDB = Depends(get_current_user)):
+    _require_admin(user)
+    return await rollups.run_once()
+
+
+@router.get("/products/{product_id}")
+async def product_series(
+    product_id: str,
+    granularity: str = _GRANULARITY,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    user: UserInDB = Depends(get_current_user),
+):
+    _require_admin(user)
+    return await rollups.series("product", product_id, granularity, since, until)
+
+
+@router.get("/categories/{category}")
+async def category_series(
+    category: str,
+    granularity: str = _GRANULARITY,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    user: UserInDB = Depends(get_current_user),
+):
+    _require_admin(user)
+    return await rollups.series("category", category.upper(), granularity, since, until)
+
+
+@router.get("/top")
+async def top_keys(
+    dimension: str = Query("product", pattern="^(product|category)$"),
+    granularity: str = _GRANULARITY,
+    action: Optional[ActionEnum] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(10, ge=1, le=100),
+    user: UserInDB = Depends(get_current_user),
+):
+    _require_admin(user)
+    return await rollups.top(dimension, granularity, action.value if action else None, since, until, limit)
@@ -0,0 +1,103 @@
+import json
+import zlib
+from datetime import datetime
+from enum import Enum
+from typing import AsyncIterator, Dict, Optional
+
+from bson import ObjectId
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from app.core.config import settings
+from app.core.db import actions_coll, products_coll
+from app.core.security import get_current_user
+from app.models import ActionEnum, UserInDB
+from app.routers.users import _require_admin
+
+router = APIRouter(prefix="/api/v1/export", tags=["export"])
+
+_FLUSH_BYTES = 64 * 1024
+
+
+def _json_default(o):
+    if isinstance(o, ObjectId):
+        return str(o)
+    if isinstance(o, datetime):
+        return o.isoformat()
+    if isinstance(o, Enum):
+        return o.value
+    raise TypeError(f"{type(o).__name__} is not JSON serializable")
+
+
+async def _ndjson(cursor, compress: bool) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(settings.export_gzip_level, zlib.DEFLATED, 31) if compress else None
+    buf = bytearray()
+    async for doc in cursor:
+        buf += json.dumps(doc, default=_json_default, ensure_ascii=False).encode("utf-8")
+        buf += b"\n"
+        if len(buf) >= _FLUSH_BYTES:
+            chunk = compressor.compress(bytes(buf)) if compressor else bytes(buf)
+            buf.clear()
+            if chunk:
+                yield chunk
+    tail = compressor.compress(bytes(buf)) + compressor.flush() if compressor else bytes(buf)
+    if tail:
+        yield tail
+
+
+def _stream(cursor, name: str, compress: bool) -> StreamingResponse:
+    if compress:
+        return StreamingResponse(
+            _ndjson(cursor, True),
+            media_type="application/gzip",
+            headers={"Content-Disposition": f'attachment; filename="{name}.ndjson.gz"'},
+        )
+    return StreamingResponse(
+        _ndjson(cursor, False),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{name}.ndjson"'},
+    )
+
+
+@router.get("/products")
+async def export_products(
+    category: Optional[str] = None,
+    gzip: bool = Query(False),
+    user: UserInDB = Depends(get_current_user),
+):
+    _require_admin(user)
+    q: Dict = {}
+    if category:
+        q["category"] = {"$in": [c.strip().upper() for c in category.split(",") if c.strip()]}
+    cursor = products_coll.find(q).batch_size(settings.export_batch_size)
+    return _stream(cursor, "products", gzip)
+
+
+@router.get("/actions")
+async def export_actions(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    action: Optional[str] = Query(None, description="CSV: VIEW,LIKE,PURCHASE"),
+    user_id: Optional[str] = None,
+    gzip: bool = Query(False),
+    user: UserInDB = Depends(get_current_user),
+):
+    _require_admin(user)
+    q: Dict = {}
+    if since is not None or until is not None:
+        q["timestamp"] = {}
+        if since is not None:
+            q["timestamp"]["$gte"] = since
+        if until is not None:
+            q["timestamp"]["$lt"] = until
+    if action:
+        actions = [a.strip().upper() for a in action.split(",") if a.strip()]
+        valid = {a.value for a in ActionEnum}
+        unknown = [a for a in actions if a not in valid]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown action: {', '.join(unknown)}")
+        q["action"] = {"$in": actions}
+    if user_id:
+        q["userId"] = user_id
+    cursor = actions_coll.find(q).batch_size(settings.export_batch_size)
+    return _stream(cursor, "actions", gzip)
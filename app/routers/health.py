@@ -1,7 +1,49 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
+
+from app.core import indexes
+from app.core.auth_cache import auth_cache
+from app.core.response_cache import response_cache
+from app.core.security import get_current_user
+from app.core.workers import hash_pool
+from app.models import UserInDB
+from app.routers.users import _require_admin
+from app.services.catalog import catalog
+from app.services.event_buffer import view_buffer
+from app.services.invalidation import invalidation_bus
+from app.services.neighbors import neighbor_index
+from app.services.rollups import rollups
+from app.services.search_index import search_index
 
 router = APIRouter(prefix="/api/v1/health", tags=["health"])
 
 @router.get("")
 async def health():
     return {"status": "ok"}
+
+
+COMPONENTS = {
+    "auth_cache": auth_cache.stats,
+    "hash_pool": hash_pool.stats,
+    "catalog": catalog.stats,
+    "response_cache": response_cache.stats,
+    "search_index": search_index.stats,
+    "view_buffer": view_buffer.stats,
+    "neighbors": neighbor_index.stats,
+    "rollups": rollups.stats,
+    "invalidation": invalidation_bus.stats,
+}
+
+
+# stats name this host and process, so only the bare probe above stays public
+@router.get("/stats")
+async def stats(user: UserInDB = Depends(get_current_user)):
+    _require_admin(user)
+    return {name: fn() for name, fn in COMPONENTS.items()}
+
+
+@router.get("/indexes")
+async def index_report(refresh: bool = False, user: UserInDB = Depends(get_current_user)):
+    _require_admin(user)
+    if refresh:
+        return await indexes.report_collection_scans()
+    return indexes.last_report
@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from app.core import metrics
+from app.routers.health import COMPONENTS
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return Response(metrics.render(COMPONENTS), media_type=metrics.CONTENT_TYPE)
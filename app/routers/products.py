@@ -1,88 +1,184 @@
+import json
+import logging
 from datetime import datetime
 from typing import List, Optional
 
+import orjson
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
-from bson import ObjectId
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 
-from app.core.db import products_coll, actions_coll
+from app.core.config import settings
+from app.core.db import actions_coll
+from app.core.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, keyset_page
+from app.core.response_cache import response_cache
 from app.core.security import get_current_user
 from app.models import ProductOut, Category, ActionEnum, UserInDB
+from app.routers.users import _require_admin
+from app.services import profiles
+from app.services.bulk_ingest import BulkIngest, iter_ndjson
+from app.services.catalog import catalog, resolve_products
+from app.services.event_buffer import view_buffer
+from app.services.invalidation import invalidation_bus
+from app.services.neighbors import neighbor_index
+from app.services.popularity import popularity
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/v1/products", tags=["products"])
 
 class ProductsResponse(BaseModel):
     count: int
     items: List[ProductOut]
+    next_cursor: Optional[str] = None
 
-async def _find_product_doc(product_id: str):
-    doc = await products_coll.find_one({"_id": product_id})
-    if doc:
-        return doc
-    if ObjectId.is_valid(product_id):
-        doc = await products_coll.find_one({"_id": ObjectId(product_id)})
-    return doc
-
-def _product_out(doc) -> ProductOut:
-    return ProductOut(
-        id=str(doc["_id"]),
-        brand=doc.get("brand"),
-        model=doc.get("model"),
-        price=doc.get("price"),
-        category=doc.get("category"),
-    )
+
+async def _on_catalog_refresh(old, new):
+    response_cache.invalidate("products:")
+
+catalog.subscribe(_on_catalog_refresh)
+# another worker wrote products: reload, which also clears the list cache above
+invalidation_bus.subscribe("catalog", lambda key: catalog.request_refresh())
+
+
+async def _find_product(product_id: str):
+    return (await resolve_products([product_id])).get(product_id)
+
+# List routes return ORJSONResponse themselves: snapshot items were validated
+# when the snapshot was built, so response_model only documents the shape.
+
+def _page_body(snap, positions, sort_key, cursor, limit) -> dict:
+    page, next_cursor = keyset_page(positions, sort_key, cursor, limit)
+    items = snap.select(page)
+    return {"count": len(items), "items": items, "next_cursor": next_cursor}
+
+
+def _page_list(snap, positions, sort_key, cursor, limit) -> ORJSONResponse:
+    page, next_cursor = keyset_page(positions, sort_key, cursor, limit)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return ORJSONResponse(snap.select(page), headers=headers)
 
 
 @router.get("", response_model=ProductsResponse)  # <--- ВАЖНО: путь "" вместо "/"
-async def list_products():
-    docs = await products_coll.find({}).to_list(length=1000)
-    items = [_product_out(d) for d in docs]
-    return ProductsResponse(count=len(items), items=items)
+async def list_products(
+    request: Request,
+    use_cache: bool = Query(True),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
+    async def build() -> bytes:
+        snap = await catalog.get_snapshot()
+        return orjson.dumps(_page_body(snap, range(len(snap)), snap.id_key, cursor, limit))
+
+    if use_cache:
+        return await response_cache.serve(request, f"products:list:{limit}:{cursor or ''}", build)
+
+    snap = await catalog.get_snapshot()
+    body = _page_body(snap, range(len(snap)), snap.id_key, cursor, limit)
+    return ORJSONResponse(body, headers={"X-Cache": "BYPASS"})
 
 
 @router.get("/by-category", response_model=ProductsResponse)
 async def products_by_category(
     category: str = Query(..., description="CSV: LAPTOP,PHONE,..."),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
 ):
     cats = [c.strip().upper() for c in category.split(",") if c.strip()]
-    q = {"category": {"$in": cats}} if cats else {}
-    docs = await products_coll.find(q).to_list(length=1000)
-    items = [_product_out(d) for d in docs]
-    return ProductsResponse(count=len(items), items=items)
+    snap = await catalog.get_snapshot()
+    positions = snap.category_positions(cats) if cats else range(len(snap))
+    return ORJSONResponse(_page_body(snap, positions, snap.id_key, cursor, limit))
 
 
 @router.get("/by-brand", response_model=List[ProductOut])
-async def products_by_brand(brand: str):
-    docs = await products_coll.find({"brand": brand}).to_list(length=1000)
-    return [_product_out(d) for d in docs]
+async def products_by_brand(
+    brand: str,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
+    snap = await catalog.get_snapshot()
+    return _page_list(snap, snap.by_brand.get(brand, []), snap.id_key, cursor, limit)
 
 
 @router.get("/by-model", response_model=List[ProductOut])
-async def products_by_model(model: str):
-    docs = await products_coll.find({"model": model}).to_list(length=1000)
-    return [_product_out(d) for d in docs]
+async def products_by_model(
+    model: str,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
+    snap = await catalog.get_snapshot()
+    return _page_list(snap, snap.by_model.get(model, []), snap.id_key, cursor, limit)
 
 
 @router.get("/by-price", response_model=List[ProductOut])
 async def products_by_price(
     min: Optional[int] = Query(None, ge=0),
     max: Optional[int] = Query(None, ge=0),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
 ):
-    q = {}
-    if min is not None or max is not None:
-        q["price"] = {}
-        if min is not None:
-            q["price"]["$gte"] = min
-        if max is not None:
-            q["price"]["$lte"] = max
-    docs = await products_coll.find(q).to_list(length=1000)
-    return [_product_out(d) for d in docs]
+    snap = await catalog.get_snapshot()
+    if min is None and max is None:
+        return _page_list(snap, range(len(snap)), snap.id_key, cursor, limit)
+    return _page_list(snap, snap.price_positions(min, max), snap.price_key, cursor, limit)
+
+
+@router.post("/bulk")
+async def bulk_upsert_products(
+    request: Request,
+    batch_size: int = Query(settings.bulk_batch_size, ge=1, le=10000),
+    user: UserInDB = Depends(get_current_user),
+):
+    _require_admin(user)
+
+    ingest = BulkIngest(batch_size=batch_size, max_errors=settings.bulk_max_errors)
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonl" in content_type:
+        async for row, raw in iter_ndjson(request.stream()):
+            await ingest.add(row, raw)
+    else:
+        try:
+            body = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+        if isinstance(body, dict) and isinstance(body.get("items"), list):
+            body = body["items"]
+        if not isinstance(body, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+        for row, raw in enumerate(body):
+            await ingest.add(row, raw)
+    await ingest.flush()
+
+    if ingest.upserted or ingest.modified:
+        await catalog.mark_changed()
+        await catalog.refresh()
+        await invalidation_bus.publish("catalog")
+    return ingest.report()
+
+
+@router.get("/popular", response_model=List[ProductOut])
+async def popular_products(
+    limit: int = Query(10, ge=1, le=100),
+    category: Optional[str] = None,
+    by: str = Query("score", pattern="^(score|trending)$"),
+):
+    pids = await popularity.top_products(limit, category=category.upper() if category else None, by=by)
+    products = await resolve_products(pids)
+    return [products[pid] for pid in pids if pid in products]
+
+
+@router.get("/popular/categories")
+async def popular_categories(
+    limit: int = Query(10, ge=1, le=100),
+    by: str = Query("score", pattern="^(score|trending)$"),
+):
+    return await popularity.top_categories(limit, by=by)
 
 
 @router.get("/{product_id}", response_model=ProductOut)
 async def get_product(product_id: str, request: Request):
-    doc = await _find_product_doc(product_id)
-    if not doc:
+    product = await _find_product(product_id)
+    if not product:
         raise HTTPException(status_code=500, detail="Product not found")
 
     try:
@@ -91,72 +187,127 @@ async def get_product(product_id: str, request: Request):
         user = None
 
     if user:
-        await actions_coll.insert_one(
+        await view_buffer.add(
             {
                 "userId": user.id,
-                "productId": str(doc["_id"]),
-                "category": doc.get("category"),
+                "productId": product["id"],
+                "category": product["category"],
                 "action": ActionEnum.VIEW.value,
                 "timestamp": datetime.utcnow(),
             }
         )
 
-    return _product_out(doc)
+    return product
+
+
+@router.get("/{product_id}/similar", response_model=List[ProductOut])
+async def similar_products(product_id: str, limit: int = Query(10, ge=1, le=100)):
+    snap = await catalog.get_snapshot()
+    if product_id not in snap.by_id and not await _find_product(product_id):
+        raise HTTPException(status_code=500, detail="Product not found")
+
+    # neighbours were built offline and may point at products deleted since
+    positions = [snap.by_id[nid] for nid, _ in neighbor_index.neighbors.get(product_id, ()) if nid in snap.by_id]
+    return ORJSONResponse(snap.select(positions[:limit]))
 
 
 @router.post("/{product_id}/like")
 async def like_product(product_id: str, user: UserInDB = Depends(get_current_user)):
-    doc = await _find_product_doc(product_id)
-    if not doc:
+    product = await _find_product(product_id)
+    if not product:
         raise HTTPException(status_code=500, detail="Product not found")
 
     exists = await actions_coll.find_one(
-        {"userId": user.id, "productId": str(doc["_id"]), "action": ActionEnum.LIKE.value}
+        {"userId": user.id, "productId": product["id"], "action": ActionEnum.LIKE.value}
     )
     if exists:
         raise HTTPException(status_code=400, detail="Like already exists")
 
+    now = datetime.utcnow()
     await actions_coll.insert_one(
         {
             "userId": user.id,
-            "productId": str(doc["_id"]),
-            "category": doc.get("category"),
+            "productId": product["id"],
+            "category": product["category"],
             "action": ActionEnum.LIKE.value,
-            "timestamp": datetime.utcnow(),
+            "timestamp": now,
         }
     )
+    # the like is recorded; profile and popularity are derived and must not fail the request
+    try:
+        await profiles.record_action(
+            user.id, product["id"], product["category"], ActionEnum.LIKE.value
+        )
+    except Exception:
+        logger.exception("profile update for like failed")
+    try:
+        await popularity.record(product["id"], product["category"], ActionEnum.LIKE.value, at=now)
+    except Exception:
+        logger.exception("popularity update for like failed")
     return {"message": "liked"}
 
 
 @router.delete("/{product_id}/like")
 async def unlike_product(product_id: str, user: UserInDB = Depends(get_current_user)):
-    doc = await _find_product_doc(product_id)
-    if not doc:
+    product = await _find_product(product_id)
+    if not product:
         return {"status": 204}
 
-    await actions_coll.delete_many(
+    likes = actions_coll.find(
         {
             "userId": user.id,
-            "productId": str(doc["_id"]),
+            "productId": product["id"],
             "action": ActionEnum.LIKE.value,
-        }
+        },
+        {"timestamp": 1},
     )
+    retracted = []
+    async for like in likes:
+        res = await actions_coll.delete_one({"_id": like["_id"]})
+        if res.deleted_count:  # a concurrent unlike may have got it first
+            retracted.append(
+                (product["id"], product["category"], ActionEnum.LIKE.value, -1, like.get("timestamp"))
+            )
+    if retracted:
+        try:
+            await profiles.record_action(
+                user.id, product["id"], product["category"], ActionEnum.LIKE.value,
+                count=-len(retracted),
+            )
+        except Exception:
+            logger.exception("profile update for unlike failed")
+        try:
+            await popularity.record_many(retracted)
+        except Exception:
+            logger.exception("popularity update for unlike failed")
     return {"status": 204}
 
 
 @router.post("/{product_id}/buy")
 async def buy_product(product_id: str, user: UserInDB = Depends(get_current_user)):
-    doc = await _find_product_doc(product_id)
-    if not doc:
+    product = await _find_product(product_id)
+    if not product:
         raise HTTPException(status_code=500, detail="Product not found")
 
+    now = datetime.utcnow()
     await actions_coll.insert_one(
         {
             "userId": user.id,
-            "productId": str(doc["_id"]),
-            "category": doc.get("category"),
+            "productId": product["id"],
+            "category": product["category"],
             "action": ActionEnum.PURCHASE.value,
-            "timestamp": datetime.utcnow(),
+            "timestamp": now,
         }
     )
+    # the purchase is recorded; a 500 from derived state would invite a duplicate retry
+    try:
+        await profiles.record_action(
+            user.id, product["id"], product["category"], ActionEnum.PURCHASE.value
+        )
+    except Exception:
+        logger.exception("profile update for purchase failed")
+    try:
+        await popularity.record(product["id"], product["category"], ActionEnum.PURCHASE.value, at=now)
+    except Exception:
+        logger.exception("popularity update for purchase failed")
     return {"message": "purchased"}
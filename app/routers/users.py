@@ -1,12 +1,16 @@
+import logging
 from datetime import datetime
 from typing import List, Optional, Dict
 
 from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import PlainTextResponse
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from bson import ObjectId
+from pymongo.errors import OperationFailure
 
-from app.core.db import users_coll, actions_coll, products_coll
-from app.core.security import hash_password, verify_password, get_current_user
+from app.core.auth_cache import auth_cache
+from app.core.config import settings
+from app.core.db import client, users_coll, actions_coll
+from app.core.security import hash_password_async, verify_password_async, get_current_user
 from app.models import (
     UserRegister,
     UserPublic,
@@ -18,15 +22,39 @@ from app.models import (
     PurchaseOut,
     UserPasswordUpdate,
     AdminPasswordUpdate,
+    CheckoutRequest,
+    CheckoutItemResult,
+    CheckoutOut,
 )
+from app.services import profiles
+from app.services.catalog import catalog, resolve_products
+from app.services.invalidation import invalidation_bus
+from app.services.popularity import popularity
+from app.services.neighbors import neighbor_index
+from app.services.recommendation import model_for_snapshot, with_neighbor_scores
 
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/api/v1/users", tags=["users"])
 
+invalidation_bus.subscribe("user", auth_cache.invalidate_user)
+
+
+async def _invalidate_user(user_id: str) -> None:
+    auth_cache.invalidate_user(user_id)
+    await invalidation_bus.publish("user", user_id)
+
+
 def _is_admin(user: UserInDB) -> bool:
     return user.username == "admin"
 
 
+def _require_admin(user: UserInDB) -> None:
+    if not _is_admin(user):
+        raise HTTPException(status_code=403, detail="Admin only")
+
+
 @router.post("/registration", response_model=UserPublic)
 async def register_user(body: UserRegister):
 
@@ -45,7 +73,7 @@ async def register_user(body: UserRegister):
 
     doc = {
         "username": body.username.strip(),
-        "password": hash_password(body.password),
+        "password": await hash_password_async(body.password),
         "created_at": datetime.utcnow()
     }
 
@@ -63,7 +91,7 @@ async def login_user(username: str, password: str):
     if not user_doc:
         raise HTTPException(status_code=401, detail="Invalid username or password")
 
-    if not verify_password(password, user_doc["password"]):
+    if not await verify_password_async(password, user_doc["password"]):
         raise HTTPException(status_code=401, detail="Invalid username or password")
 
     return {
@@ -100,6 +128,7 @@ async def update_username(new_username: str, user: UserInDB = Depends(get_curren
         {"_id": ObjectId(user.id)},
         {"$set": {"username": new_username.strip(), "updated_at": datetime.utcnow()}},
     )
+    await _invalidate_user(user.id)
 
     return UserPublic(id=user.id, username=new_username.strip())
 
@@ -119,80 +148,45 @@ async def me_history(
         cursor = cursor.limit(limit)
 
     docs = await cursor.to_list(length=limit or 500)
-    out: List[UserActionOut] = []
-    for d in docs:
-        out.append(
-            UserActionOut(
-                id=str(d.get("_id")),
-                userId=d["userId"],
-                action=d["action"],
-                productId=d.get("productId"),
-                category=d.get("category"),
-                timestamp=d.get("timestamp", datetime.utcnow()),
-            )
-        )
-    return out
-
-
-def _weight(action: str) -> int:
-    if action == ActionEnum.VIEW.value:
-        return 1
-    if action == ActionEnum.LIKE.value:
-        return 3
-    if action == ActionEnum.PURCHASE.value:
-        return 5
-    return 0
+    # our own action log: trusted, so no per-row UserActionOut
+    now = datetime.utcnow()
+    return ORJSONResponse([
+        {
+            "id": str(d.get("_id")),
+            "userId": d["userId"],
+            "action": d["action"],
+            "productId": d.get("productId"),
+            "category": d.get("category"),
+            "timestamp": d.get("timestamp", now),
+        }
+        for d in docs
+    ])
 
 
 @router.get("/me/recommendation", response_model=List[ProductOut])
 async def me_recommendation(
         limit: int = Query(10, ge=1, le=100),
+        min: Optional[int] = Query(None, ge=0),
+        max: Optional[int] = Query(None, ge=0),
         user: UserInDB = Depends(get_current_user),
 ):
-
-    acts = await actions_coll.find({"userId": user.id}).to_list(length=1000)
-    if not acts:
-        return []
-
-    product_scores: Dict[str, float] = {}
-    category_scores: Dict[str, float] = {}
-
-    for a in acts:
-        w = _weight(a["action"])
-        pid = a.get("productId")
-        cat = a.get("category")
-        if pid:
-            product_scores[pid] = product_scores.get(pid, 0.0) + w
-        if cat:
-            category_scores[cat] = category_scores.get(cat, 0.0) + w
-
-    all_products = await products_coll.find({}).to_list(length=1000)
-    scored: List[tuple] = []
-
-    for p in all_products:
-        pid = str(p["_id"])
-        base = product_scores.get(pid, 0.0)
-        cat = p.get("category")
-        base += 0.5 * category_scores.get(cat, 0.0)
-        if base <= 0:
-            continue
-        scored.append((base, p))
-
-    scored.sort(key=lambda x: x[0], reverse=True)
-    top = [p for _, p in scored[:limit]]
-
-    res: List[ProductOut] = []
-    for d in top:
-        res.append(
-            ProductOut(
-                id=str(d["_id"]),
-                brand=d.get("brand"),
-                model=d.get("model"),
-                price=d.get("price"),
-                category=d.get("category"),
-            )
-        )
-    return res
+    profile = await profiles.get_profile(user.id)
+    if not profile.get("actions"):
+        # cold start: nothing known about the user yet
+        snap = await catalog.get_snapshot()
+        if min is None and max is None:
+            pids = await popularity.top_products(limit)
+        else:
+            in_range = {snap.items[pos]["id"] for pos in snap.price_positions(min, max)}
+            pids = [pid for pid in await popularity.top_products(len(snap)) if pid in in_range][:limit]
+        return ORJSONResponse(snap.select(snap.by_id[pid] for pid in pids if pid in snap.by_id))
+
+    product_scores = with_neighbor_scores(profile.get("products", {}), neighbor_index.neighbors)
+    category_scores: Dict[str, float] = profile.get("categories", {})
+
+    snap = await catalog.get_snapshot()
+    model = model_for_snapshot(snap)
+    return ORJSONResponse(snap.select(model.top_k(product_scores, category_scores, limit, min, max).tolist()))
 
 @router.get("/me/purchases", response_model=List[PurchaseOut])
 async def me_purchases(
@@ -209,42 +203,89 @@ async def me_purchases(
         cursor = cursor.limit(limit)
 
     acts = await cursor.to_list(length=limit or 500)
-    result: List[PurchaseOut] = []
-
-    for a in acts:
-        pid = a.get("productId")
-        if not pid:
+    products = await resolve_products(a["productId"] for a in acts if a.get("productId"))
+    now = datetime.utcnow()
+    # products may come straight from Mongo, so response_model still validates
+    return [
+        {"timestamp": a.get("timestamp", now), "product": products[a["productId"]]}
+        for a in acts
+        if a.get("productId") in products
+    ]
+
+async def _insert_purchases(docs: List[dict]) -> None:
+    if not settings.checkout_transactions:
+        await actions_coll.insert_many(docs, ordered=False)
+        return
+
+    async def txn(session):
+        await actions_coll.insert_many(docs, session=session)
+
+    try:
+        async with await client.start_session() as session:
+            await session.with_transaction(txn)
+    except OperationFailure as e:
+        # standalone mongod has no transactions
+        if e.code != 20:
+            raise
+        logger.warning("checkout transactions unavailable, writing without one: %s", e)
+        await actions_coll.insert_many(docs, ordered=False)
+
+
+@router.post("/me/checkout", response_model=CheckoutOut)
+async def checkout(body: CheckoutRequest, user: UserInDB = Depends(get_current_user)):
+    products_by_id = await resolve_products(it.productId for it in body.items)
+    now = datetime.utcnow()
+
+    results: List[CheckoutItemResult] = []
+    actions: List[dict] = []
+    for it in body.items:
+        product = products_by_id.get(it.productId)
+        if not product:
+            results.append(CheckoutItemResult(productId=it.productId, quantity=it.quantity, status="not_found"))
             continue
-
-        doc = await products_coll.find_one({"_id": ObjectId(pid)}) if ObjectId.is_valid(pid) \
-            else await products_coll.find_one({"_id": pid})
-
-        if not doc:
-            continue
-
-        product = ProductOut(
-            id=str(doc["_id"]),
-            brand=doc.get("brand"),
-            model=doc.get("model"),
-            price=doc.get("price"),
-            category=doc.get("category"),
+        for _ in range(it.quantity):
+            actions.append(
+                {
+                    "userId": user.id,
+                    "productId": product["id"],
+                    "category": product["category"],
+                    "action": ActionEnum.PURCHASE.value,
+                    "timestamp": now,
+                }
+            )
+        results.append(
+            CheckoutItemResult(
+                productId=it.productId,
+                quantity=it.quantity,
+                status="purchased",
+                product=ProductOut(**product),
+            )
         )
 
-        result.append(
-            PurchaseOut(
-                timestamp=a.get("timestamp", datetime.utcnow()),
-                product=product,
+    if actions:
+        await _insert_purchases(actions)
+        # purchases are recorded; a 500 here would invite a duplicate checkout
+        try:
+            await profiles.record_actions(actions)
+        except Exception:
+            logger.exception("profile update for checkout failed")
+        try:
+            await popularity.record_many(
+                (a["productId"], a["category"], a["action"], 1, a["timestamp"]) for a in actions
             )
-        )
+        except Exception:
+            logger.exception("popularity update for checkout failed")
+
+    purchased = sum(1 for r in results if r.status == "purchased")
+    return CheckoutOut(purchased=purchased, failed=len(results) - purchased, items=results)
 
-    return result
 
 @router.post("/me/update/password")
 async def update_password(
     body: UserPasswordUpdate,
     user: UserInDB = Depends(get_current_user),
 ):
-    if not verify_password(body.old_password, user.password):
+    if not await verify_password_async(body.old_password, user.password):
         raise HTTPException(status_code=400, detail="Текущий пароль указан неверно")
 
     if len(body.new_password) < 6:
@@ -260,18 +301,18 @@ async def update_password(
         {"_id": ObjectId(user.id)},
         {
             "$set": {
-                "password": hash_password(body.new_password),
+                "password": await hash_password_async(body.new_password),
                 "updated_at": datetime.utcnow(),
             }
         },
     )
+    await _invalidate_user(user.id)
 
     return {"message": "Password updated"}
 
 @router.get("/admin/users", response_model=List[UserPublic])
 async def admin_list_users(current: UserInDB = Depends(get_current_user)):
-    if not _is_admin(current):
-        raise HTTPException(status_code=403, detail="Admin only")
+    _require_admin(current)
 
     cursor = users_coll.find({})
     docs = await cursor.to_list(length=1000)
@@ -287,8 +328,7 @@ async def admin_list_users(current: UserInDB = Depends(get_current_user)):
 
 @router.delete("/admin/users/{user_id}")
 async def admin_delete_user(user_id: str, current: UserInDB = Depends(get_current_user)):
-    if not _is_admin(current):
-        raise HTTPException(status_code=403, detail="Admin only")
+    _require_admin(current)
 
     doc = await users_coll.find_one({"_id": ObjectId(user_id)}) if ObjectId.is_valid(user_id) \
         else await users_coll.find_one({"_id": user_id})
@@ -300,6 +340,8 @@ async def admin_delete_user(user_id: str, current: UserInDB = Depends(get_curren
 
     await users_coll.delete_one({"_id": doc["_id"]})
     await actions_coll.delete_many({"userId": str(doc["_id"])})
+    await profiles.delete_profile(str(doc["_id"]))
+    await _invalidate_user(str(doc["_id"]))
 
     return {"status": "deleted"}
 
@@ -309,8 +351,7 @@ async def admin_update_user_password(
     body: AdminPasswordUpdate,
     current: UserInDB = Depends(get_current_user),
 ):
-    if not _is_admin(current):
-        raise HTTPException(status_code=403, detail="Admin only")
+    _require_admin(current)
 
     if len(body.new_password) < 6:
         raise HTTPException(status_code=400, detail="Новый пароль должен быть не менее 6 символов")
@@ -331,11 +372,12 @@ async def admin_update_user_password(
         {"_id": doc["_id"]},
         {
             "$set": {
-                "password": hash_password(body.new_password),
+                "password": await hash_password_async(body.new_password),
                 "updated_at": datetime.utcnow(),
             }
         },
     )
+    await _invalidate_user(str(doc["_id"]))
 
     return {"message": "Password updated by admin"}
 
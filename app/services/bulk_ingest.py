@@ -0,0 +1,129 @@
+import json
+import time
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+from bson import ObjectId
+from pydantic import ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.core.db import products_coll
+from app.models import ProductBulkIn
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    """Yield ``(row, parsed)`` per non-empty line; ``parsed`` is an exception on bad JSON."""
+    buf = b""
+    row = 0
+    async for chunk in chunks:
+        buf += chunk
+        *lines, buf = buf.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield row, _parse_line(line)
+                row += 1
+    if buf.strip():
+        yield row, _parse_line(buf)
+
+
+def _parse_line(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return e
+
+
+class BulkIngest:
+    """Validates product rows in chunks and upserts them with unordered bulk writes.
+
+    Rows with an ``id`` are upserted by ``_id``; rows without one are
+    upserted on the (brand, model) natural key.
+    """
+
+    def __init__(self, batch_size: int, max_errors: int):
+        self.batch_size = max(1, batch_size)
+        self.max_errors = max_errors
+        self.started = time.perf_counter()
+        self.rows = 0
+        self.valid = 0
+        self.upserted = 0
+        self.matched = 0
+        self.modified = 0
+        self.batches = 0
+        self.error_count = 0
+        self.errors: List[Dict[str, Any]] = []
+        self._pending: List[Tuple[int, Any]] = []
+
+    def _error(self, row: int, message: str) -> None:
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"row": row, "error": message})
+
+    async def add(self, row: int, raw: Any) -> None:
+        self.rows += 1
+        self._pending.append((row, raw))
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        pending, self._pending = self._pending, []
+        ops: List[UpdateOne] = []
+        op_rows: List[int] = []
+
+        for row, raw in pending:
+            if isinstance(raw, Exception):
+                self._error(row, f"invalid JSON: {raw}")
+                continue
+            try:
+                product = ProductBulkIn.model_validate(raw)
+            except ValidationError as e:
+                self._error(row, "; ".join(
+                    f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()
+                ))
+                continue
+
+            fields = product.model_dump(mode="json", exclude={"id"}, exclude_unset=True)
+            if product.id:
+                key = ObjectId(product.id) if ObjectId.is_valid(product.id) and len(product.id) == 24 else product.id
+                flt = {"_id": key}
+            elif product.brand and product.model:
+                flt = {"brand": product.brand, "model": product.model}
+            else:
+                self._error(row, "either id or both brand and model are required")
+                continue
+
+            ops.append(UpdateOne(flt, {"$set": fields}, upsert=True))
+            op_rows.append(row)
+
+        self.valid += len(ops)
+        if not ops:
+            return
+
+        self.batches += 1
+        try:
+            res = await products_coll.bulk_write(ops, ordered=False)
+            details = res.bulk_api_result
+        except BulkWriteError as e:
+            details = e.details
+            for err in details.get("writeErrors", []):
+                self._error(op_rows[err["index"]], err.get("errmsg", "write error"))
+            self.valid -= len(details.get("writeErrors", []))
+        self.upserted += details.get("nUpserted", 0)
+        self.matched += details.get("nMatched", 0)
+        self.modified += details.get("nModified", 0)
+
+    def report(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "rows": self.rows,
+            "valid": self.valid,
+            "upserted": self.upserted,
+            "matched": self.matched,
+            "modified": self.modified,
+            "batches": self.batches,
+            "error_count": self.error_count,
+            "errors": self.errors,
+            "errors_truncated": self.error_count > len(self.errors),
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(self.rows / elapsed, 1) if elapsed > 0 else None,
+        }
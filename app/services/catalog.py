@@ -0,0 +1,292 @@
+import asyncio
+import logging
+import time
+from bisect import bisect_left, bisect_right
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+from bson import ObjectId
+from pydantic import ValidationError
+
+from app.core.config import settings
+from app.core.db import db, products_coll
+from app.core.pagination import id_sort_key
+from app.models import ProductOut
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_PROJECTION = {"brand": 1, "model": 1, "price": 1, "category": 1}
+
+catalog_meta_coll = db["catalog_meta"]
+
+# a poll whose change marker is unchanged skips the reload, but every this
+# many polls reloads anyway for writers that do not bump the marker
+_MAX_SKIPPED_POLLS = 10
+
+
+def product_payload(doc: dict) -> dict:
+    """JSON-ready ``ProductOut`` shape of a products document."""
+    return {
+        "id": str(doc["_id"]),
+        "brand": doc.get("brand"),
+        "model": doc.get("model"),
+        "price": doc.get("price"),
+        "category": doc.get("category"),
+    }
+
+
+Listener = Callable[[Optional["CatalogSnapshot"], "CatalogSnapshot"], Awaitable[None]]
+
+
+class CatalogSnapshot:
+    """Immutable in-memory copy of the products collection.
+
+    Products are kept in ``_id`` order as ``ProductOut`` payloads, validated
+    once here so routes can serialize them as-is; the secondary indexes hold
+    positions into that list, always ascending so results keep catalog order.
+    """
+
+    def __init__(self, docs: List[dict], version: int):
+        self.version = version
+        self.loaded_at = time.time()
+        self.items: List[dict] = []
+        self.by_id: Dict[str, int] = {}
+        self.by_category: Dict[str, List[int]] = {}
+        self.by_brand: Dict[str, List[int]] = {}
+        self.by_model: Dict[str, List[int]] = {}
+        self.id_keys: List[tuple] = []
+
+        docs = sorted(docs, key=lambda d: id_sort_key(d["_id"]))
+        for doc in docs:
+            item = product_payload(doc)
+            try:
+                ProductOut.model_validate(item)
+            except ValidationError as e:
+                logger.warning("skipping product %s: %s", doc.get("_id"), e)
+                continue
+
+            pos = len(self.items)
+            self.items.append(item)
+            self.id_keys.append(id_sort_key(doc["_id"]))
+            self.by_id[item["id"]] = pos
+            if item["category"] is not None:
+                self.by_category.setdefault(item["category"], []).append(pos)
+            if item["brand"] is not None:
+                self.by_brand.setdefault(item["brand"], []).append(pos)
+            if item["model"] is not None:
+                self.by_model.setdefault(item["model"], []).append(pos)
+
+        priced = [pos for pos, it in enumerate(self.items) if isinstance(it["price"], (int, float))]
+        priced.sort(key=lambda pos: self.items[pos]["price"])
+        self.price_order: List[int] = priced
+        self.prices: List[float] = [self.items[pos]["price"] for pos in priced]
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def get(self, product_id: str) -> Optional[dict]:
+        pos = self.by_id.get(product_id)
+        return self.items[pos] if pos is not None else None
+
+    def select(self, positions: Iterable[int]) -> List[dict]:
+        items = self.items
+        return [items[pos] for pos in positions]
+
+    def id_key(self, pos: int) -> tuple:
+        return self.id_keys[pos]
+
+    def price_key(self, pos: int) -> tuple:
+        return (self.items[pos]["price"],) + self.id_keys[pos]
+
+    def category_positions(self, categories: List[str]) -> List[int]:
+        if len(categories) == 1:
+            return self.by_category.get(categories[0], [])
+        merged = set()
+        for cat in categories:
+            merged.update(self.by_category.get(cat, ()))
+        return sorted(merged)
+
+    def price_positions(self, min_price: Optional[int], max_price: Optional[int]) -> List[int]:
+        lo = 0 if min_price is None else bisect_left(self.prices, min_price)
+        hi = len(self.prices) if max_price is None else bisect_right(self.prices, max_price)
+        return self.price_order[lo:hi]
+
+
+class CatalogService:
+    """Process-wide catalog snapshot with background refresh.
+
+    Refreshes are driven by a products change stream when the deployment
+    supports one, otherwise by polling every ``refresh_seconds``. A poll
+    first compares a cheap change marker (estimated count, newest ``_id``
+    and the version ``mark_changed`` bumps) and skips the reload when it is
+    unchanged. Snapshots are built in a thread so a reload does not stall
+    the event loop.
+    """
+
+    def __init__(self, refresh_seconds: float, use_change_stream: bool):
+        self.refresh_seconds = refresh_seconds
+        self.use_change_stream = use_change_stream
+        self.snapshot: Optional[CatalogSnapshot] = None
+        self.mode = "idle"
+        self.refreshes = 0
+        self.skipped_polls = 0
+        self._skipped = 0
+        self._marker: Optional[tuple] = None
+        self._version = 0
+        self._load_lock = asyncio.Lock()
+        self._dirty = asyncio.Event()
+        self._listeners: List[Listener] = []
+        self._tasks: List[asyncio.Task] = []
+
+    def subscribe(self, listener: Listener) -> None:
+        self._listeners.append(listener)
+
+    async def get_snapshot(self) -> CatalogSnapshot:
+        snap = self.snapshot
+        if snap is not None:
+            return snap
+        async with self._load_lock:
+            if self.snapshot is None:
+                await self._reload()
+        return self.snapshot
+
+    async def refresh(self) -> CatalogSnapshot:
+        async with self._load_lock:
+            await self._reload()
+        return self.snapshot
+
+    def request_refresh(self) -> None:
+        self._dirty.set()
+
+    async def mark_changed(self) -> None:
+        """Record that products were written; call before ``refresh``."""
+        await catalog_meta_coll.update_one({"_id": "products"}, {"$inc": {"version": 1}}, upsert=True)
+
+    async def _read_marker(self) -> tuple:
+        count = await products_coll.estimated_document_count()
+        newest = await products_coll.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+        meta = await catalog_meta_coll.find_one({"_id": "products"})
+        return count, newest["_id"] if newest else None, meta["version"] if meta else 0
+
+    async def _reload(self) -> None:
+        started = time.perf_counter()
+        # read before the products, so a write racing the load shows up next poll
+        marker = await self._read_marker()
+        cursor = products_coll.find({}, PRODUCT_PROJECTION).sort("_id", 1).batch_size(5000)
+        docs = [doc async for doc in cursor]
+        self._version += 1
+        new = await asyncio.to_thread(CatalogSnapshot, docs, self._version)
+        self._marker = marker
+        self._skipped = 0
+        old, self.snapshot = self.snapshot, new
+        self.refreshes += 1
+        logger.info(
+            "catalog snapshot v%d: %d products in %.1f ms",
+            new.version, len(new), 1000 * (time.perf_counter() - started),
+        )
+        for listener in self._listeners:
+            try:
+                await listener(old, new)
+            except Exception:
+                logger.exception("catalog listener %r failed", listener)
+
+    async def start(self) -> None:
+        await self.get_snapshot()
+        self._tasks.append(asyncio.create_task(self._refresh_loop()))
+        if self.use_change_stream:
+            self._tasks.append(asyncio.create_task(self._watch_loop()))
+        else:
+            self.mode = "polling"
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        self.mode = "idle"
+
+    async def _watch_loop(self) -> None:
+        try:
+            async with products_coll.watch() as stream:
+                self.mode = "change_stream"
+                async for _ in stream:
+                    self._dirty.set()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # standalone mongod: change streams need a replica set
+            logger.info("catalog change stream unavailable (%s), polling instead", e)
+        self.mode = "polling"
+        self._dirty.set()
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            timeout = self.refresh_seconds if self.mode != "change_stream" else None
+            if timeout is not None and timeout <= 0:
+                timeout = None
+            polled = False
+            try:
+                async with asyncio.timeout(timeout):
+                    await self._dirty.wait()
+            except TimeoutError:
+                polled = True
+            self._dirty.clear()
+            try:
+                if polled and self._skipped < _MAX_SKIPPED_POLLS and await self._read_marker() == self._marker:
+                    self._skipped += 1
+                    self.skipped_polls += 1
+                    continue
+                await self.refresh()
+            except Exception:
+                logger.exception("catalog refresh failed")
+
+    def stats(self) -> dict:
+        snap = self.snapshot
+        return {
+            "mode": self.mode,
+            "version": snap.version if snap else 0,
+            "products": len(snap) if snap else 0,
+            "loaded_at": snap.loaded_at if snap else None,
+            "refreshes": self.refreshes,
+            "skipped_polls": self.skipped_polls,
+        }
+
+
+catalog = CatalogService(
+    refresh_seconds=settings.catalog_refresh_seconds,
+    use_change_stream=settings.catalog_change_stream,
+)
+
+
+async def resolve_products(product_ids: Iterable[str]) -> Dict[str, dict]:
+    """Map product ids to ``product_payload`` dicts in at most one round-trip.
+
+    Ids are looked up in the catalog snapshot first; the rest are fetched
+    with a single ``$in`` over both their string and ``ObjectId`` forms.
+    A string ``_id`` wins over an ``ObjectId`` one, as in the old lookup.
+    The snapshot's dicts are shared: callers must not modify them.
+    """
+    snap = await catalog.get_snapshot()
+    found: Dict[str, dict] = {}
+    missing: List[str] = []
+    for pid in dict.fromkeys(product_ids):
+        item = snap.get(pid)
+        if item is not None:
+            found[pid] = item
+        elif pid:
+            missing.append(pid)
+
+    if not missing:
+        return found
+
+    oid_to_pid = {ObjectId(pid): pid for pid in missing if ObjectId.is_valid(pid)}
+    wanted = set(missing)
+    keys: List[object] = list(missing) + list(oid_to_pid)
+    async for doc in products_coll.find({"_id": {"$in": keys}}, PRODUCT_PROJECTION):
+        _id = doc["_id"]
+        if isinstance(_id, ObjectId):
+            pid = oid_to_pid.get(_id)
+            if pid is not None:
+                found.setdefault(pid, product_payload(doc))
+        elif _id in wanted:
+            found[_id] = product_payload(doc)
+    return found
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import time
+from typing import List, Optional
+
+from pymongo.errors import BulkWriteError
+
+from app.core.config import settings
+from app.core.db import actions_coll
+from . import profiles
+
+logger = logging.getLogger(__name__)
+
+
+class EventBuffer:
+    """Write-behind queue for low-value action events (product views).
+
+    Events are flushed with one unordered ``insert_many`` once ``batch_size``
+    are queued or ``flush_seconds`` have passed since the first one. When the
+    queue is full the ``drop`` policy discards the event and counts it, while
+    ``block`` makes the request wait for room. Until the flusher is started
+    events are written straight through.
+    """
+
+    def __init__(self, max_size: int, batch_size: int, flush_seconds: float, policy: str):
+        self.max_size = max_size
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = flush_seconds
+        self.policy = policy
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: Optional[asyncio.Future] = None
+        # the batch _run is still collecting; stop() writes it out
+        self._pending: List[dict] = []
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.flushes = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def add(self, event: dict) -> None:
+        if not self.running:
+            await self._write([event])
+            return
+
+        if self.policy == "block":
+            await self._queue.put(event)
+        else:
+            try:
+                self._queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self.dropped += 1
+                return
+        self.enqueued += 1
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if not self.running:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        if self._inflight is not None:
+            await asyncio.gather(self._inflight, return_exceptions=True)
+            self._inflight = None
+
+        batch, self._pending = self._pending, []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+            if len(batch) >= self.batch_size:
+                await self._write(batch)
+                batch = []
+        if batch:
+            await self._write(batch)
+
+    async def _run(self) -> None:
+        queue = self._queue
+        while True:
+            batch = self._pending = [await queue.get()]
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                # asyncio.timeout rather than wait_for: on 3.11 wait_for can swallow
+                # a cancel that races with get(), leaving stop() waiting forever
+                try:
+                    async with asyncio.timeout(remaining):
+                        batch.append(await queue.get())
+                except TimeoutError:
+                    break
+            # shielded so that stop() cancelling the loop never cuts a flush in half
+            self._pending = []
+            self._inflight = asyncio.ensure_future(self._write(batch))
+            await asyncio.shield(self._inflight)
+            self._inflight = None
+
+    async def _write(self, batch: List[dict]) -> None:
+        self.flushes += 1
+        written = len(batch)
+        try:
+            await actions_coll.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            written = e.details.get("nInserted", 0)
+            logger.error("view buffer: %d of %d events failed", len(batch) - written, len(batch))
+        except Exception:
+            logger.exception("view buffer: flush of %d events failed", len(batch))
+            self.failed += len(batch)
+            return
+        self.written += written
+        self.failed += len(batch) - written
+
+        try:
+            await profiles.record_actions(batch)
+        except Exception:
+            logger.exception("view buffer: profile update failed")
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "policy": self.policy,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_size": self.max_size,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "written": self.written,
+            "failed": self.failed,
+            "flushes": self.flushes,
+        }
+
+
+view_buffer = EventBuffer(
+    max_size=settings.view_buffer_max_size,
+    batch_size=settings.view_buffer_batch_size,
+    flush_seconds=settings.view_buffer_flush_seconds,
+    policy=settings.view_buffer_policy,
+)
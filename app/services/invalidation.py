@@ -0,0 +1,179 @@
+import asyncio
+import inspect
+import logging
+import os
+import socket
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Union
+
+from bson import ObjectId
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+from app.core.config import settings
+from app.core.db import db
+
+logger = logging.getLogger(__name__)
+
+BUS_COLLECTION = "cache_invalidations"
+
+bus_coll = db[BUS_COLLECTION]
+
+Handler = Callable[[str], Union[None, Awaitable[None]]]
+
+# ids remembered to skip replays when a tail cursor is reopened
+_SEEN_MAX = 4096
+# how far back a reopened cursor looks; ObjectIds from different workers
+# are only ordered to the second
+_REOPEN_OVERLAP = timedelta(seconds=2)
+
+
+class InvalidationBus:
+    """Cross-worker cache invalidation over a capped collection.
+
+    ``publish(topic, key)`` inserts ``{topic, key, origin}`` into a capped
+    collection. Every worker tails it with a tailable await cursor, which
+    works on a standalone mongod (unlike change streams), and runs the
+    handlers subscribed to the topic. Messages from this worker's own
+    ``origin`` are skipped: the writer invalidates its own caches inline.
+    A dead cursor is reopened slightly before the last message seen, and
+    replays are dropped by id. Anything missed while the bus is down is
+    still bounded by each cache's own TTL or refresh interval.
+    """
+
+    def __init__(self, enabled: bool, size_bytes: int, max_docs: int, retry_seconds: float):
+        self.enabled = enabled
+        self.size_bytes = size_bytes
+        self.max_docs = max_docs
+        self.retry_seconds = retry_seconds
+        self.origin = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.mode = "idle"
+        self.published = 0
+        self.publish_errors = 0
+        self.received = 0
+        self.applied = 0
+        self.handler_errors = 0
+        self.reconnects = 0
+        self._handlers: Dict[str, List[Handler]] = {}
+        self._seen: "OrderedDict[ObjectId, None]" = OrderedDict()
+        self._last: Optional[ObjectId] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, topic: str, handler: Handler) -> None:
+        self._handlers.setdefault(topic, []).append(handler)
+
+    async def publish(self, topic: str, key: str = "") -> None:
+        """Tell the other workers to drop ``topic``/``key``; never fails the write path."""
+        if self.mode != "tailing":
+            return
+        try:
+            await bus_coll.insert_one(
+                {"topic": topic, "key": key, "origin": self.origin, "ts": datetime.utcnow()}
+            )
+            self.published += 1
+        except Exception as e:
+            self.publish_errors += 1
+            logger.warning("invalidation publish %s:%s failed: %s", topic, key, e)
+
+    async def _ensure_collection(self) -> bool:
+        try:
+            await db.create_collection(BUS_COLLECTION, capped=True, size=self.size_bytes, max=self.max_docs)
+        except (CollectionInvalid, OperationFailure):
+            pass  # another worker created it first
+        options = await bus_coll.options()
+        if not options.get("capped"):
+            logger.warning("%s exists but is not capped; invalidation bus disabled", BUS_COLLECTION)
+            return False
+        return True
+
+    async def start(self) -> None:
+        if not self.enabled:
+            self.mode = "disabled"
+            return
+        try:
+            if not await self._ensure_collection():
+                self.mode = "unavailable"
+                return
+            # only messages published from now on matter to a fresh process
+            newest = await bus_coll.find_one({}, {"_id": 1}, sort=[("$natural", -1)])
+            self._last = newest["_id"] if newest else ObjectId.from_datetime(datetime.utcnow())
+            since = ObjectId.from_datetime(self._last.generation_time - _REOPEN_OVERLAP)
+            async for doc in bus_coll.find({"_id": {"$gte": since}}, {"_id": 1}):
+                self._seen[doc["_id"]] = None
+        except Exception as e:
+            logger.warning("invalidation bus unavailable (%s); caches stay per-process", e)
+            self.mode = "unavailable"
+            return
+        self.mode = "tailing"
+        self._task = asyncio.create_task(self._tail_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.mode = "idle"
+
+    async def _tail_loop(self) -> None:
+        while True:
+            try:
+                since = ObjectId.from_datetime(self._last.generation_time - _REOPEN_OVERLAP)
+                cursor = bus_coll.find(
+                    {"_id": {"$gte": since}}, cursor_type=CursorType.TAILABLE_AWAIT
+                ).max_await_time_ms(int(self.retry_seconds * 1000))
+                while cursor.alive:
+                    async for msg in cursor:
+                        await self._dispatch(msg)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("invalidation tail cursor failed: %s", e)
+            # the cursor dies when the collection is empty or was dropped
+            self.reconnects += 1
+            await asyncio.sleep(self.retry_seconds)
+
+    async def _dispatch(self, msg: dict) -> None:
+        _id = msg["_id"]
+        if _id in self._seen:
+            return
+        self._seen[_id] = None
+        if len(self._seen) > _SEEN_MAX:
+            self._seen.popitem(last=False)
+        if self._last is None or _id.generation_time > self._last.generation_time:
+            self._last = _id
+        if msg.get("origin") == self.origin:
+            return
+
+        self.received += 1
+        for handler in self._handlers.get(msg.get("topic"), ()):
+            try:
+                result = handler(msg.get("key", ""))
+                if inspect.isawaitable(result):
+                    await result
+                self.applied += 1
+            except Exception:
+                self.handler_errors += 1
+                logger.exception("invalidation handler for %s failed", msg.get("topic"))
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "origin": self.origin,
+            "topics": sorted(self._handlers),
+            "published": self.published,
+            "publish_errors": self.publish_errors,
+            "received": self.received,
+            "applied": self.applied,
+            "handler_errors": self.handler_errors,
+            "reconnects": self.reconnects,
+        }
+
+
+invalidation_bus = InvalidationBus(
+    enabled=settings.invalidation_bus_enabled,
+    size_bytes=settings.invalidation_bus_size_bytes,
+    max_docs=settings.invalidation_bus_max_docs,
+    retry_seconds=settings.invalidation_bus_retry_seconds,
+)
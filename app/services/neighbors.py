@@ -0,0 +1,76 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.db import db
+
+logger = logging.getLogger(__name__)
+
+neighbors_coll = db["product_neighbors"]
+neighbors_meta_coll = db["product_neighbors_meta"]
+
+
+class NeighborIndex:
+    """Top-M similar products per product, built offline by ``item_neighbors``.
+
+    The whole table is held in memory so a lookup is a single dict hit. It
+    is reloaded when the builder publishes a new ``built_at`` in the meta
+    collection.
+    """
+
+    def __init__(self, reload_seconds: float):
+        self.reload_seconds = reload_seconds
+        self.neighbors: Dict[str, List[Tuple[str, float]]] = {}
+        self.built_at: Optional[datetime] = None
+        self.loaded_at: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _published(self) -> Optional[datetime]:
+        meta = await neighbors_meta_coll.find_one({"_id": "product_neighbors"})
+        return meta.get("built_at") if meta else None
+
+    async def load(self) -> int:
+        built_at = await self._published()
+        neighbors: Dict[str, List[Tuple[str, float]]] = {}
+        async for doc in neighbors_coll.find({}, {"neighbors": 1}):
+            neighbors[doc["_id"]] = [(n["id"], n["score"]) for n in doc.get("neighbors", [])]
+        self.neighbors = neighbors
+        self.built_at = built_at
+        self.loaded_at = datetime.utcnow()
+        logger.info("loaded neighbors for %d products (built %s)", len(neighbors), built_at)
+        return len(neighbors)
+
+    async def start(self) -> None:
+        try:
+            await self.load()
+        except Exception:
+            logger.exception("loading product neighbors failed")
+        if self.reload_seconds > 0:
+            self._task = asyncio.create_task(self._reload_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _reload_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.reload_seconds)
+            try:
+                if await self._published() != self.built_at:
+                    await self.load()
+            except Exception:
+                logger.exception("reloading product neighbors failed")
+
+    def stats(self) -> dict:
+        return {
+            "products": len(self.neighbors),
+            "built_at": self.built_at.isoformat() if self.built_at else None,
+            "loaded_at": self.loaded_at.isoformat() if self.loaded_at else None,
+        }
+
+
+neighbor_index = NeighborIndex(reload_seconds=settings.neighbors_reload_seconds)
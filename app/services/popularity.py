@@ -0,0 +1,293 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import DESCENDING, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.core.config import settings
+from app.core.db import actions_coll, db
+from app.models import ActionEnum
+from .profiles import action_weight
+
+logger = logging.getLogger(__name__)
+
+product_popularity_coll = db["product_popularity"]
+category_popularity_coll = db["category_popularity"]
+popularity_meta_coll = db["popularity_meta"]
+
+POSITIVE_ACTIONS = (ActionEnum.LIKE.value, ActionEnum.PURCHASE.value)
+
+# A trend generation spans this many half-lives; scores within one are
+# scaled up by at most 2**this.
+_GENERATION_HALF_LIVES = 20
+# attempts for increments that race a generation change on the same counter
+_MAX_WRITE_ATTEMPTS = 3
+
+# (product_id, category, action, count, timestamp or None for now)
+Event = Tuple[Optional[str], Optional[str], str, int, Optional[datetime]]
+
+
+def _rescale_factor(generations: int) -> float:
+    """Multiplier moving a trend ``generations`` generations forward."""
+    return 2.0 ** (-_GENERATION_HALF_LIVES * generations)
+
+
+class PopularityStore:
+    """Incrementally maintained popularity counters.
+
+    ``score`` counts positive actions (likes + purchases) per product and
+    per category. ``trend`` is an exponentially decayed score with half-life
+    ``half_life_hours``. To keep each update a plain ``$inc`` it is stored
+    scaled by ``2 ** ((t - epoch) / half_life)``, so older events weigh
+    relatively less. The epoch steps forward every ``_GENERATION_HALF_LIVES``
+    half-lives from a fixed origin, so every worker derives the current
+    generation from the clock instead of caching a shared epoch. Each
+    counter records the generation its ``trend`` is scaled for; increments
+    only apply to a counter of their own generation, and older counters are
+    rescaled, one conditional update each, when a new generation starts.
+    """
+
+    def __init__(self, half_life_hours: float, compact_seconds: float):
+        self.half_life_seconds = half_life_hours * 3600
+        self.compact_seconds = compact_seconds
+        self.origin: Optional[datetime] = None
+        self.generation: Optional[int] = None  # newest generation rescaled to
+        self._task: Optional[asyncio.Task] = None
+
+    def _span(self) -> timedelta:
+        return timedelta(seconds=self.half_life_seconds * _GENERATION_HALF_LIVES)
+
+    def _generation_at(self, at: datetime) -> int:
+        return max(0, (at - self.origin) // self._span())
+
+    def _epoch(self, generation: int) -> datetime:
+        return self.origin + generation * self._span()
+
+    def _factor(self, at: datetime, generation: int) -> float:
+        return 2 ** ((at - self._epoch(generation)).total_seconds() / self.half_life_seconds)
+
+    async def _load_origin(self) -> None:
+        meta = await popularity_meta_coll.find_one({"_id": "trend"})
+        if meta is None:
+            await popularity_meta_coll.update_one(
+                {"_id": "trend"}, {"$setOnInsert": {"epoch": datetime.utcnow()}}, upsert=True
+            )
+            meta = await popularity_meta_coll.find_one({"_id": "trend"})
+        self.origin = meta["epoch"]
+
+    async def _current_generation(self) -> int:
+        if self.origin is None:
+            await self._load_origin()
+        generation = self._generation_at(datetime.utcnow())
+        if self.generation != generation:
+            await self._rescale(generation)
+            self.generation = generation
+        return generation
+
+    async def _rescale(self, generation: int) -> None:
+        """Bring every counter of an older generation up to ``generation``."""
+        for coll in (product_popularity_coll, category_popularity_coll):
+            # counters written before generations existed were scaled for the origin
+            await coll.update_many({"gen": {"$exists": False}}, {"$set": {"gen": 0}})
+            for old in await coll.distinct("gen", {"gen": {"$lt": generation}}):
+                # conditional on the old generation, so a counter is rescaled exactly once
+                await coll.update_many(
+                    {"gen": old},
+                    {"$mul": {"trend": _rescale_factor(generation - old)}, "$set": {"gen": generation}},
+                )
+
+    def _incs(self, events: Iterable[Event], generation: int) -> Tuple[Dict, Dict]:
+        now = datetime.utcnow()
+        per_product: Dict[str, Dict] = {}
+        per_category: Dict[str, Dict] = {}
+
+        for pid, category, action, count, at in events:
+            if action not in POSITIVE_ACTIONS:
+                continue
+            field = "likes" if action == ActionEnum.LIKE.value else "purchases"
+            # a retraction is weighed at the time of the action it retracts
+            trend = action_weight(action) * count * self._factor(at or now, generation)
+            targets = []
+            if pid:
+                targets.append(per_product.setdefault(pid, {"inc": {}, "set": {"category": category}}))
+            if category:
+                targets.append(per_category.setdefault(category, {"inc": {}, "set": {}}))
+            for t in targets:
+                inc = t["inc"]
+                inc[field] = inc.get(field, 0) + count
+                inc["score"] = inc.get("score", 0) + count
+                inc["trend"] = inc.get("trend", 0.0) + trend
+                t["set"]["updated_at"] = now
+        return per_product, per_category
+
+    async def _apply(self, coll, updates: Dict[str, Dict], generation: int) -> None:
+        pending = {key: (generation, u) for key, u in updates.items()}
+        for attempt in range(_MAX_WRITE_ATTEMPTS):
+            keys = list(pending)
+            ops = []
+            for key in keys:
+                gen, u = pending[key]
+                ops.append(UpdateOne({"_id": key, "gen": gen}, {"$inc": u["inc"], "$set": u["set"]}, upsert=True))
+            try:
+                await coll.bulk_write(ops, ordered=False)
+                return
+            except BulkWriteError as e:
+                errors = e.details.get("writeErrors", [])
+                if attempt == _MAX_WRITE_ATTEMPTS - 1 or any(err.get("code") != 11000 for err in errors):
+                    raise
+            # the counter exists under another generation: another worker
+            # crossed a generation boundary first, or this one did and the
+            # counter was written by a worker that had not yet
+            failed = {keys[err["index"]] for err in errors}
+            pending = {key: pending[key] for key in failed}
+            async for doc in coll.find({"_id": {"$in": list(failed)}}, {"gen": 1}):
+                gen, u = pending[doc["_id"]]
+                other = doc.get("gen", 0)
+                if other < gen:
+                    await coll.update_one(
+                        {"_id": doc["_id"], "gen": other},
+                        {"$mul": {"trend": _rescale_factor(gen - other)}, "$set": {"gen": gen}},
+                    )
+                elif other > gen:
+                    inc = dict(u["inc"], trend=u["inc"]["trend"] * _rescale_factor(other - gen))
+                    pending[doc["_id"]] = (other, {**u, "inc": inc})
+
+    async def record(
+        self,
+        product_id: str,
+        category: Optional[str],
+        action: str,
+        count: int = 1,
+        at: Optional[datetime] = None,
+    ) -> None:
+        """Apply one action; a negative ``count`` retracts one made at ``at`` (e.g. unlike)."""
+        await self.record_many([(product_id, category, action, count, at)])
+
+    async def record_many(self, events: Iterable[Event]) -> None:
+        generation = await self._current_generation()
+        per_product, per_category = self._incs(events, generation)
+        writes = []
+        if per_product:
+            writes.append(self._apply(product_popularity_coll, per_product, generation))
+        if per_category:
+            writes.append(self._apply(category_popularity_coll, per_category, generation))
+        if writes:
+            await asyncio.gather(*writes)
+
+    async def top_products(self, limit: int, category: Optional[str] = None, by: str = "score") -> List[str]:
+        field = "trend" if by == "trending" else "score"
+        if field == "trend":
+            await self._current_generation()
+        q: Dict = {field: {"$gt": 0}}
+        if category:
+            q["category"] = category
+        cursor = product_popularity_coll.find(q, {"_id": 1}).sort(field, DESCENDING).limit(limit)
+        return [doc["_id"] async for doc in cursor]
+
+    async def top_categories(self, limit: int, by: str = "score") -> List[dict]:
+        field = "trend" if by == "trending" else "score"
+        if field == "trend":
+            await self._current_generation()
+        cursor = category_popularity_coll.find({field: {"$gt": 0}}).sort(field, DESCENDING).limit(limit)
+        return [
+            {"category": doc["_id"], "score": doc.get("score", 0), "likes": doc.get("likes", 0),
+             "purchases": doc.get("purchases", 0)}
+            async for doc in cursor
+        ]
+
+    async def rebuild(self) -> int:
+        """Recompute every counter from user_actions (initial backfill)."""
+        generation = await self._current_generation()
+        weight_expr = {
+            "$switch": {
+                "branches": [
+                    {"case": {"$eq": ["$action", a]}, "then": action_weight(a)} for a in POSITIVE_ACTIONS
+                ],
+                "default": 0,
+            }
+        }
+        decay_expr = {
+            "$pow": [2, {"$divide": [{"$subtract": ["$timestamp", self._epoch(generation)]}, self.half_life_seconds * 1000]}]
+        }
+        pipeline = [
+            {"$match": {"action": {"$in": list(POSITIVE_ACTIONS)}, "productId": {"$ne": None}}},
+            {
+                "$group": {
+                    "_id": "$productId",
+                    "category": {"$last": "$category"},
+                    "likes": {"$sum": {"$cond": [{"$eq": ["$action", ActionEnum.LIKE.value]}, 1, 0]}},
+                    "purchases": {"$sum": {"$cond": [{"$eq": ["$action", ActionEnum.PURCHASE.value]}, 1, 0]}},
+                    "trend": {"$sum": {"$multiply": [weight_expr, decay_expr]}},
+                }
+            },
+        ]
+
+        now = datetime.utcnow()
+        products = 0
+        product_ops: List[ReplaceOne] = []
+        per_category: Dict[str, Dict] = {}
+        async for row in actions_coll.aggregate(pipeline, allowDiskUse=True):
+            products += 1
+            doc = {
+                "category": row.get("category"),
+                "likes": row["likes"],
+                "purchases": row["purchases"],
+                "score": row["likes"] + row["purchases"],
+                "trend": row["trend"],
+                "gen": generation,
+                "updated_at": now,
+            }
+            product_ops.append(ReplaceOne({"_id": row["_id"]}, doc, upsert=True))
+            if doc["category"]:
+                c = per_category.setdefault(doc["category"], {"likes": 0, "purchases": 0, "score": 0, "trend": 0.0})
+                for k in c:
+                    c[k] += doc[k]
+            if len(product_ops) >= 1000:
+                await product_popularity_coll.bulk_write(product_ops, ordered=False)
+                product_ops = []
+        if product_ops:
+            await product_popularity_coll.bulk_write(product_ops, ordered=False)
+        if per_category:
+            await category_popularity_coll.bulk_write(
+                [ReplaceOne({"_id": cat}, {**c, "gen": generation, "updated_at": now}, upsert=True) for cat, c in per_category.items()],
+                ordered=False,
+            )
+        return products
+
+    async def compact(self) -> None:
+        """Prune empty counters and rescale trends when a generation starts."""
+        await product_popularity_coll.delete_many({"score": {"$lte": 0}})
+        await category_popularity_coll.delete_many({"score": {"$lte": 0}})
+        await self._current_generation()
+
+    async def start(self) -> None:
+        await self._current_generation()
+        if settings.popularity_backfill and await product_popularity_coll.estimated_document_count() == 0:
+            try:
+                await self.rebuild()
+            except Exception:
+                logger.exception("popularity backfill failed")
+        if self.compact_seconds > 0:
+            self._task = asyncio.create_task(self._compact_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _compact_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.compact_seconds)
+            try:
+                await self.compact()
+            except Exception:
+                logger.exception("popularity compaction failed")
+
+
+popularity = PopularityStore(
+    half_life_hours=settings.popularity_half_life_hours,
+    compact_seconds=settings.popularity_compact_seconds,
+)
@@ -0,0 +1,159 @@
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from app.core.db import actions_coll, profiles_coll
+from app.models import ActionEnum
+
+ACTION_WEIGHTS: Dict[str, int] = {
+    ActionEnum.VIEW.value: 1,
+    ActionEnum.LIKE.value: 3,
+    ActionEnum.PURCHASE.value: 5,
+}
+
+# Every increment bumps a profile's "version"; a rebuild only replaces the
+# version it started from and retries this many times when it loses a race.
+_REBUILD_ATTEMPTS = 3
+
+
+def action_weight(action: str) -> int:
+    return ACTION_WEIGHTS.get(action, 0)
+
+
+def _field_key(value: Optional[str]) -> Optional[str]:
+    # Mongo field names cannot contain dots or start with "$"
+    if not value or "." in value or value.startswith("$"):
+        return None
+    return value
+
+
+def profile_increments(product_id: Optional[str], category: Optional[str], action: str, count: int = 1) -> Dict[str, int]:
+    w = action_weight(action) * count
+    inc = {"actions": count}
+    pid = _field_key(product_id)
+    cat = _field_key(category)
+    if pid:
+        inc[f"products.{pid}"] = w
+    if cat:
+        inc[f"categories.{cat}"] = w
+    return inc
+
+
+async def record_action(
+    user_id: str,
+    product_id: Optional[str],
+    category: Optional[str],
+    action: str,
+    count: int = 1,
+) -> None:
+    """Apply one action (or ``count`` of them; negative to retract) atomically."""
+    await profiles_coll.update_one(
+        {"_id": user_id},
+        {
+            "$inc": {**profile_increments(product_id, category, action, count), "version": 1},
+            "$set": {"updated_at": datetime.utcnow()},
+        },
+        upsert=True,
+    )
+
+
+async def record_actions(events: Iterable[dict]) -> None:
+    """Apply a batch of action events with one unordered bulk write."""
+    per_user: Dict[str, Dict[str, int]] = {}
+    for e in events:
+        inc = per_user.setdefault(e["userId"], {})
+        for key, value in profile_increments(e.get("productId"), e.get("category"), e["action"]).items():
+            inc[key] = inc.get(key, 0) + value
+    if not per_user:
+        return
+
+    now = datetime.utcnow()
+    await profiles_coll.bulk_write(
+        [
+            UpdateOne({"_id": uid}, {"$inc": {**inc, "version": 1}, "$set": {"updated_at": now}}, upsert=True)
+            for uid, inc in per_user.items()
+        ],
+        ordered=False,
+    )
+
+
+async def _aggregate_profile(user_id: str) -> dict:
+    weight_expr = {
+        "$switch": {
+            "branches": [
+                {"case": {"$eq": ["$action", action]}, "then": w}
+                for action, w in ACTION_WEIGHTS.items()
+            ],
+            "default": 0,
+        }
+    }
+    pipeline = [
+        {"$match": {"userId": user_id}},
+        {
+            "$group": {
+                "_id": {"productId": "$productId", "category": "$category"},
+                "score": {"$sum": weight_expr},
+                "n": {"$sum": 1},
+            }
+        },
+    ]
+
+    products: Dict[str, int] = {}
+    categories: Dict[str, int] = {}
+    actions = 0
+    async for row in actions_coll.aggregate(pipeline):
+        actions += row["n"]
+        pid = _field_key(row["_id"].get("productId"))
+        cat = _field_key(row["_id"].get("category"))
+        if pid:
+            products[pid] = products.get(pid, 0) + row["score"]
+        if cat:
+            categories[cat] = categories.get(cat, 0) + row["score"]
+
+    return {
+        "_id": user_id,
+        "products": products,
+        "categories": categories,
+        "actions": actions,
+        "complete": True,
+        "updated_at": datetime.utcnow(),
+    }
+
+
+async def rebuild_profile(user_id: str) -> dict:
+    """Recompute a profile from the raw action log (backfill for legacy users).
+
+    The result only replaces the profile if no increment landed on it while
+    the log was being aggregated; otherwise the rebuild starts over. If it
+    keeps losing, the computed profile is returned without being stored and
+    the next read tries again.
+    """
+    doc: dict = {}
+    for _ in range(_REBUILD_ATTEMPTS):
+        current = await profiles_coll.find_one({"_id": user_id}, {"version": 1})
+        doc = await _aggregate_profile(user_id)
+        if current is None:
+            doc["version"] = 1
+            try:
+                await profiles_coll.insert_one(doc)
+                return doc
+            except DuplicateKeyError:
+                continue  # the first increment created it meanwhile
+        doc["version"] = current.get("version", 0) + 1
+        res = await profiles_coll.replace_one({"_id": user_id, "version": current.get("version")}, doc)
+        if res.matched_count:
+            return doc
+    return doc
+
+
+async def get_profile(user_id: str) -> dict:
+    doc = await profiles_coll.find_one({"_id": user_id})
+    if doc is None or not doc.get("complete"):
+        doc = await rebuild_profile(user_id)
+    return doc
+
+
+async def delete_profile(user_id: str) -> None:
+    await profiles_coll.delete_one({"_id": user_id})
@@ -0,0 +1,157 @@
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .profiles import action_weight
+
+CATEGORY_FACTOR = 0.5
+NEIGHBOR_FACTOR = 0.5
+# only the user's strongest products seed the neighbour signal, keeping it O(seeds * M)
+NEIGHBOR_SEEDS = 20
+
+
+def accumulate_scores(actions: Iterable[dict]) -> Tuple[Dict[str, float], Dict[str, float]]:
+    product_scores: Dict[str, float] = {}
+    category_scores: Dict[str, float] = {}
+    for a in actions:
+        w = action_weight(a.get("action"))
+        pid = a.get("productId")
+        cat = a.get("category")
+        if pid:
+            product_scores[pid] = product_scores.get(pid, 0.0) + w
+        if cat:
+            category_scores[cat] = category_scores.get(cat, 0.0) + w
+    return product_scores, category_scores
+
+
+def with_neighbor_scores(
+    product_scores: Mapping[str, float],
+    neighbors: Mapping[str, Sequence[Tuple[str, float]]],
+    seeds: int = NEIGHBOR_SEEDS,
+) -> Dict[str, float]:
+    """Add the "users who bought X also bought" signal to ``product_scores``.
+
+    Each of the top ``seeds`` products passes ``weight * similarity`` on to
+    its precomputed neighbours, scaled by ``NEIGHBOR_FACTOR``.
+    """
+    combined = dict(product_scores)
+    if not neighbors:
+        return combined
+    top = sorted((w, pid) for pid, w in product_scores.items() if w > 0)[-seeds:]
+    for w, pid in top:
+        for nid, sim in neighbors.get(pid, ()):
+            combined[nid] = combined.get(nid, 0.0) + NEIGHBOR_FACTOR * w * sim
+    return combined
+
+
+class ScoringModel:
+    """Dense product arrays for scoring a user profile in one vector op.
+
+    ``score = product_weights + 0.5 * category_weights[cat_codes]``; products
+    without a category point at a trailing slot that always weighs zero.
+    ``prices`` (NaN where missing) restricts candidates to a price range.
+    Rank ties are broken by product index, i.e. by the order the products
+    were given in, matching a stable sort over that list.
+    """
+
+    def __init__(
+        self,
+        product_ids: List[str],
+        categories: List[Optional[str]],
+        prices: Optional[List] = None,
+        version: int = 0,
+    ):
+        self.version = version
+        self.product_ids = product_ids
+        self.index: Dict[str, int] = {pid: i for i, pid in enumerate(product_ids)}
+        self.category_names: List[str] = sorted({c for c in categories if c})
+        self.category_index: Dict[str, int] = {c: i for i, c in enumerate(self.category_names)}
+        none_code = len(self.category_names)
+        self.cat_codes = np.fromiter(
+            (self.category_index.get(c, none_code) if c else none_code for c in categories),
+            dtype=np.int32,
+            count=len(categories),
+        )
+        self.prices = np.fromiter(
+            (p if isinstance(p, (int, float)) else np.nan for p in (prices or [None] * len(product_ids))),
+            dtype=np.float64,
+            count=len(product_ids),
+        )
+
+    @classmethod
+    def from_items(cls, items: List[dict], version: int = 0) -> "ScoringModel":
+        """Build from ``product_payload`` dicts, e.g. a catalog snapshot's items."""
+        return cls(
+            [it["id"] for it in items],
+            [it["category"] for it in items],
+            [it["price"] for it in items],
+            version,
+        )
+
+    def __len__(self) -> int:
+        return len(self.product_ids)
+
+    def score(
+        self,
+        product_scores: Mapping[str, float],
+        category_scores: Mapping[str, float],
+    ) -> np.ndarray:
+        product_weights = np.zeros(len(self.product_ids), dtype=np.float64)
+        idx = [self.index[pid] for pid in product_scores if pid in self.index]
+        if idx:
+            product_weights[idx] = [product_scores[self.product_ids[i]] for i in idx]
+
+        category_weights = np.zeros(len(self.category_names) + 1, dtype=np.float64)
+        for cat, w in category_scores.items():
+            code = self.category_index.get(cat)
+            if code is not None:
+                category_weights[code] = w
+
+        return product_weights + CATEGORY_FACTOR * category_weights[self.cat_codes]
+
+    def top_k(
+        self,
+        product_scores: Mapping[str, float],
+        category_scores: Mapping[str, float],
+        k: int,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+    ) -> np.ndarray:
+        """Indices of the ``k`` best positively-scored products in the price range, best first."""
+        scores = self.score(product_scores, category_scores)
+        keep = scores > 0
+        if min_price is not None:
+            keep &= self.prices >= min_price
+        if max_price is not None:
+            keep &= self.prices <= max_price
+        cand = np.flatnonzero(keep)
+        if cand.size > k:
+            vals = scores[cand]
+            kth = vals[np.argpartition(-vals, k - 1)[:k]].min()
+            above = cand[vals > kth]
+            ties = cand[vals == kth][: k - above.size]
+            cand = np.concatenate([above, ties])
+        order = np.lexsort((cand, -scores[cand]))
+        return cand[order]
+
+    def recommend(
+        self,
+        product_scores: Mapping[str, float],
+        category_scores: Mapping[str, float],
+        k: int,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+    ) -> List[str]:
+        return [
+            self.product_ids[i] for i in self.top_k(product_scores, category_scores, k, min_price, max_price)
+        ]
+
+
+_model: Optional[ScoringModel] = None
+
+
+def model_for_snapshot(snap) -> ScoringModel:
+    global _model
+    if _model is None or _model.version != snap.version:
+        _model = ScoringModel.from_items(snap.items, snap.version)
+    return _model
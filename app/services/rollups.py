@@ -0,0 +1,231 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from app.core.config import settings
+from app.core.db import actions_coll, db
+from app.models import ActionEnum
+
+logger = logging.getLogger(__name__)
+
+rollups_coll = db["action_rollups"]
+rollup_meta_coll = db["rollup_meta"]
+
+GRANULARITIES = ("hour", "day")
+DIMENSIONS = ("product", "category")
+ACTIONS = tuple(a.value for a in ActionEnum)
+
+_HOUR_FORMAT = "%Y-%m-%dT%H"
+
+
+def _trunc(ts: datetime, granularity: str) -> datetime:
+    if granularity == "day":
+        return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def _empty_counts() -> Dict[str, int]:
+    return {**{a: 0 for a in ACTIONS}, "total": 0}
+
+
+class RollupService:
+    """Hourly and daily action counts per product and per category.
+
+    Each run advances a ``timestamp`` watermark over ``user_actions`` up to
+    ``now - lag`` (so buffered writes have landed), in windows of at most
+    ``window_hours``. The hour holding the previous watermark is recounted
+    from the raw log and written with ``$set``, and the days touched are
+    re-summed from their hourly docs, so rerunning a window after a crash
+    never double counts. Rollups are historical: deleting a user's actions
+    does not rewrite buckets that were already rolled up.
+    """
+
+    def __init__(self, lag_seconds: float, interval_seconds: float, window_hours: int, batch_size: int):
+        self.lag = timedelta(seconds=lag_seconds)
+        self.interval_seconds = interval_seconds
+        self.window = timedelta(hours=max(1, window_hours))
+        self.batch_size = max(1, batch_size)
+        self.runs = 0
+        self.last_run: Optional[dict] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def watermark(self) -> Optional[datetime]:
+        meta = await rollup_meta_coll.find_one({"_id": "actions"})
+        return meta.get("watermark") if meta else None
+
+    async def _bulk(self, ops: List[UpdateOne]) -> None:
+        for i in range(0, len(ops), self.batch_size):
+            await rollups_coll.bulk_write(ops[i:i + self.batch_size], ordered=False)
+
+    async def _roll_hours(self, start: datetime, end: datetime) -> int:
+        pipeline = [
+            {"$match": {"timestamp": {"$gte": start, "$lt": end}}},
+            {
+                "$group": {
+                    "_id": {
+                        "h": {"$dateToString": {"format": _HOUR_FORMAT, "date": "$timestamp"}},
+                        "p": "$productId",
+                        "c": "$category",
+                        "a": "$action",
+                    },
+                    "n": {"$sum": 1},
+                }
+            },
+        ]
+        buckets: Dict[Tuple[datetime, str, str], Dict[str, int]] = {}
+        async for row in actions_coll.aggregate(pipeline, allowDiskUse=True):
+            g = row["_id"]
+            action = g.get("a")
+            if action not in ACTIONS:
+                continue
+            hour = datetime.strptime(g["h"], _HOUR_FORMAT)
+            for dim, key in (("product", g.get("p")), ("category", g.get("c"))):
+                if not key:
+                    continue
+                counts = buckets.setdefault((hour, dim, str(key)), _empty_counts())
+                counts[action] += row["n"]
+                counts["total"] += row["n"]
+
+        now = datetime.utcnow()
+        await self._bulk([
+            UpdateOne(
+                {"granularity": "hour", "dimension": dim, "key": key, "bucket": hour},
+                {"$set": {"counts": counts, "updated_at": now}},
+                upsert=True,
+            )
+            for (hour, dim, key), counts in buckets.items()
+        ])
+        return len(buckets)
+
+    async def _roll_days(self, first_day: datetime, last_day: datetime) -> int:
+        group_id = {
+            "d": {"$dateToString": {"format": "%Y-%m-%d", "date": "$bucket"}},
+            "dim": "$dimension",
+            "key": "$key",
+        }
+        pipeline = [
+            {
+                "$match": {
+                    "granularity": "hour",
+                    "bucket": {"$gte": first_day, "$lt": last_day + timedelta(days=1)},
+                }
+            },
+            {"$group": {"_id": group_id, **{a: {"$sum": f"$counts.{a}"} for a in ACTIONS + ("total",)}}},
+        ]
+        now = datetime.utcnow()
+        ops = []
+        async for row in rollups_coll.aggregate(pipeline, allowDiskUse=True):
+            g = row["_id"]
+            ops.append(UpdateOne(
+                {"granularity": "day", "dimension": g["dim"], "key": g["key"], "bucket": datetime.strptime(g["d"], "%Y-%m-%d")},
+                {"$set": {"counts": {a: row[a] for a in ACTIONS + ("total",)}, "updated_at": now}},
+                upsert=True,
+            ))
+        await self._bulk(ops)
+        return len(ops)
+
+    async def run_once(self) -> dict:
+        async with self._lock:
+            started = datetime.utcnow()
+            upper = started - self.lag
+            watermark = await self.watermark()
+            if watermark is None:
+                first = await actions_coll.find_one({"timestamp": {"$ne": None}}, {"timestamp": 1}, sort=[("timestamp", 1)])
+                watermark = _trunc(first["timestamp"], "hour") if first else upper
+
+            hour_docs = day_docs = windows = 0
+            while watermark < upper:
+                start = _trunc(watermark, "hour")
+                end = min(upper, start + self.window)
+                hour_docs += await self._roll_hours(start, end)
+                day_docs += await self._roll_days(_trunc(start, "day"), _trunc(end, "day"))
+                watermark = end
+                await rollup_meta_coll.update_one(
+                    {"_id": "actions"}, {"$set": {"watermark": watermark, "updated_at": datetime.utcnow()}}, upsert=True
+                )
+                windows += 1
+
+            self.runs += 1
+            self.last_run = {
+                "started_at": started.isoformat(),
+                "watermark": watermark.isoformat(),
+                "windows": windows,
+                "hour_docs": hour_docs,
+                "day_docs": day_docs,
+                "seconds": round((datetime.utcnow() - started).total_seconds(), 3),
+            }
+            return self.last_run
+
+    async def series(
+        self, dimension: str, key: str, granularity: str, since: Optional[datetime], until: Optional[datetime]
+    ) -> List[dict]:
+        q: Dict = {"granularity": granularity, "dimension": dimension, "key": key}
+        if since is not None or until is not None:
+            q["bucket"] = {}
+            if since is not None:
+                q["bucket"]["$gte"] = _trunc(since, granularity)
+            if until is not None:
+                q["bucket"]["$lt"] = until
+        cursor = rollups_coll.find(q, {"_id": 0, "bucket": 1, "counts": 1}).sort("bucket", 1)
+        return [{"bucket": doc["bucket"], **doc["counts"]} async for doc in cursor]
+
+    async def top(
+        self,
+        dimension: str,
+        granularity: str,
+        action: Optional[str],
+        since: Optional[datetime],
+        until: Optional[datetime],
+        limit: int,
+    ) -> List[dict]:
+        match: Dict = {"granularity": granularity, "dimension": dimension}
+        if since is not None or until is not None:
+            match["bucket"] = {}
+            if since is not None:
+                match["bucket"]["$gte"] = _trunc(since, granularity)
+            if until is not None:
+                match["bucket"]["$lt"] = until
+        field = action or "total"
+        pipeline = [
+            {"$match": match},
+            {"$group": {"_id": "$key", **{a: {"$sum": f"$counts.{a}"} for a in ACTIONS + ("total",)}}},
+            {"$sort": {field: -1, "_id": 1}},
+            {"$limit": limit},
+        ]
+        return [
+            {"key": row.pop("_id"), **row}
+            async for row in rollups_coll.aggregate(pipeline, allowDiskUse=True)
+        ]
+
+    async def start(self) -> None:
+        if self.interval_seconds > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("action rollup failed")
+            await asyncio.sleep(self.interval_seconds)
+
+    def stats(self) -> dict:
+        return {"runs": self.runs, "running": self._task is not None, "last_run": self.last_run}
+
+
+rollups = RollupService(
+    lag_seconds=settings.rollup_lag_seconds,
+    interval_seconds=settings.rollup_interval_seconds,
+    window_hours=settings.rollup_window_hours,
+    batch_size=settings.rollup_batch_size,
+)
@@ -0,0 +1,245 @@
+import heapq
+import re
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Set, Tuple
+
+from .catalog import CatalogSnapshot, catalog
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_PREFIX_CACHE_SIZE = 1024
+# apply() rebuilds instead when more than 1/this of the catalog changed
+_REBUILD_FRACTION = 4
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+class SearchIndex:
+    """Token/prefix inverted index over product brand and model.
+
+    Every product gets a stable slot number; posting lists, category lists
+    and the price list hold slots, and ranking ties go to the lower slot.
+    A full build assigns slots in catalog order. ``apply`` gives added and
+    changed products new slots at the end, so until the next rebuild those
+    sort after unchanged products on ties. Removed products leave a
+    tombstone until the next full rebuild.
+    """
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self) -> None:
+        self.version = 0
+        self.slot_of: Dict[str, int] = {}
+        self.items: List[Optional[dict]] = []
+        self.tokens_of: List[Tuple[frozenset, frozenset]] = []
+        self.price_of: List[float] = []
+        self.postings: Dict[str, Set[int]] = {}
+        self.vocab: List[str] = []
+        self.by_category: Dict[str, Set[int]] = {}
+        self.prices: List[Tuple[float, int]] = []
+        self.live: Set[int] = set()
+        self._prefix_cache: Dict[str, Set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.live)
+
+    def build(self, snap: CatalogSnapshot) -> None:
+        self._reset()
+        for item in snap.items:
+            self._add(item, bulk=True)
+        # sorted once here; insort per product is quadratic at catalog scale
+        self.vocab.sort()
+        self.prices.sort()
+        self.version = snap.version
+
+    def ensure(self, snap: CatalogSnapshot) -> None:
+        if self.version != snap.version:
+            self.build(snap)
+
+    def apply(self, old: Optional[CatalogSnapshot], new: CatalogSnapshot) -> None:
+        """Bring the index in line with ``new``, touching only changed products."""
+        dead = len(self.items) - len(self.live)
+        if old is None or self.version != old.version or dead > len(self.live):
+            self.build(new)
+            return
+
+        removed = [pid for pid in self.slot_of if pid not in new.by_id]
+        changed = []
+        for pid, pos in new.by_id.items():
+            item = new.items[pos]
+            old_item = old.get(pid)
+            if old_item is None or pid not in self.slot_of or old_item != item:
+                changed.append(item)
+        if len(removed) + len(changed) > len(new) // _REBUILD_FRACTION:
+            self.build(new)
+            return
+
+        for pid in removed:
+            self._remove(pid)
+        for item in changed:
+            self._remove(item["id"])
+            self._add(item)
+        self.version = new.version
+
+    def _add(self, item: dict, bulk: bool = False) -> None:
+        """Index ``item``; with ``bulk`` the caller sorts ``vocab`` and ``prices`` afterwards."""
+        slot = len(self.items)
+        brand_tokens = frozenset(tokenize(item["brand"]))
+        all_tokens = brand_tokens | frozenset(tokenize(item["model"]))
+        price = item["price"] or 0
+
+        self.slot_of[item["id"]] = slot
+        self.items.append(item)
+        self.tokens_of.append((all_tokens, brand_tokens))
+        self.price_of.append(price)
+        self.live.add(slot)
+
+        for token in all_tokens:
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = set()
+                if bulk:
+                    self.vocab.append(token)
+                else:
+                    insort(self.vocab, token)
+            posting.add(slot)
+        if item["category"] is not None:
+            self.by_category.setdefault(item["category"], set()).add(slot)
+        if bulk:
+            self.prices.append((price, slot))
+        else:
+            insort(self.prices, (price, slot))
+        self._prefix_cache.clear()
+
+    def _remove(self, pid: str) -> None:
+        slot = self.slot_of.pop(pid, None)
+        if slot is None:
+            return
+        item = self.items[slot]
+        all_tokens, _ = self.tokens_of[slot]
+
+        for token in all_tokens:
+            posting = self.postings[token]
+            posting.discard(slot)
+            if not posting:
+                del self.postings[token]
+                del self.vocab[bisect_left(self.vocab, token)]
+        if item["category"] is not None:
+            cat_slots = self.by_category[item["category"]]
+            cat_slots.discard(slot)
+            if not cat_slots:
+                del self.by_category[item["category"]]
+        del self.prices[bisect_left(self.prices, (self.price_of[slot], slot))]
+
+        self.items[slot] = None
+        self.tokens_of[slot] = (frozenset(), frozenset())
+        self.live.discard(slot)
+        self._prefix_cache.clear()
+
+    def _prefix_slots(self, prefix: str) -> Set[int]:
+        cached = self._prefix_cache.get(prefix)
+        if cached is not None:
+            return cached
+
+        exact = self.postings.get(prefix)
+        result: Set[int] = set(exact) if exact else set()
+        i = bisect_left(self.vocab, prefix)
+        while i < len(self.vocab) and self.vocab[i].startswith(prefix):
+            if self.vocab[i] != prefix:
+                result |= self.postings[self.vocab[i]]
+            i += 1
+
+        if len(self._prefix_cache) >= _PREFIX_CACHE_SIZE:
+            self._prefix_cache.clear()
+        self._prefix_cache[prefix] = result
+        return result
+
+    def _price_range(self, price_from: Optional[int], price_to: Optional[int]) -> Tuple[int, int]:
+        lo = 0 if price_from is None else bisect_left(self.prices, (price_from, -1))
+        hi = len(self.prices) if price_to is None else bisect_left(self.prices, (price_to, len(self.items)))
+        return lo, hi
+
+    def _score(self, slot: int, query_tokens: List[str]) -> int:
+        all_tokens, brand_tokens = self.tokens_of[slot]
+        score = 0
+        for qt in query_tokens:
+            score += 2 if qt in all_tokens else 1
+            if any(t.startswith(qt) for t in brand_tokens):
+                score += 1
+        return score
+
+    def search(
+        self,
+        q: str = "",
+        category: Optional[str] = None,
+        price_from: Optional[int] = None,
+        price_to: Optional[int] = None,
+        limit: int = 50,
+        offset: int = 0,
+    ) -> Tuple[int, List[dict]]:
+        query_tokens = list(dict.fromkeys(tokenize(q)))
+        if not query_tokens and (q or "").strip():
+            return 0, []  # e.g. only punctuation: matches nothing, not everything
+
+        sets: List[Set[int]] = []
+        for qt in query_tokens:
+            sets.append(self._prefix_slots(qt))
+        if category:
+            sets.append(self.by_category.get(category, set()))
+
+        price_filtered = price_from is not None or price_to is not None
+        if price_filtered:
+            lo, hi = self._price_range(price_from, price_to)
+            smallest = min((len(s) for s in sets), default=None)
+            if smallest is None or hi - lo < smallest:
+                sets.append({slot for _, slot in self.prices[lo:hi]})
+            else:
+                low = -float("inf") if price_from is None else price_from
+                high = float("inf") if price_to is None else price_to
+                price_of = self.price_of
+                sets.sort(key=len)
+                sets[0] = {s for s in sets[0] if low <= price_of[s] <= high}
+
+        if not sets:
+            total = len(self.live)
+            page = []
+            for slot, item in enumerate(self.items):
+                if item is None:
+                    continue
+                if offset:
+                    offset -= 1
+                    continue
+                page.append(item)
+                if len(page) >= limit:
+                    break
+            return total, page
+
+        sets.sort(key=len)
+        matched = sets[0].intersection(*sets[1:]) if len(sets) > 1 else sets[0]
+        total = len(matched)
+        k = offset + limit
+
+        if query_tokens:
+            ranked = heapq.nsmallest(k, ((-self._score(s, query_tokens), s) for s in matched))
+            slots = [s for _, s in ranked]
+        else:
+            slots = heapq.nsmallest(k, matched)
+        return total, [self.items[s] for s in slots[offset:]]
+
+    def stats(self) -> dict:
+        return {
+            "products": len(self.live),
+            "tombstones": len(self.items) - len(self.live),
+            "tokens": len(self.vocab),
+        }
+
+
+search_index = SearchIndex()
+
+
+async def _on_catalog_refresh(old: Optional[CatalogSnapshot], new: CatalogSnapshot) -> None:
+    search_index.apply(old, new)
+
+catalog.subscribe(_on_catalog_refresh)
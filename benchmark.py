@@ -0,0 +1,463 @@
+"""In-process benchmark of the routes exercised by locustfile.py.
+
+Drives ``app.main:app`` through ``httpx.ASGITransport`` (no server, no
+network) against mongomock-motor by default, or a real mongod with
+``--mongo-uri``. Seeds a catalog and an action log, measures p50/p95/p99
+latency and RPS per route, writes the results as JSON and, with
+``--thresholds``, exits non-zero if any route regressed past its limits.
+
+    python benchmark.py --products 5000 --actions 50000 --out bench.json
+    python benchmark.py --thresholds benchmark_thresholds.json
+    python benchmark.py --micro --products 1000
+
+Thresholds are keyed by backend, then route name:
+``{"mongomock": {"routes": {"search": {"p95_ms": 15, "min_rps": 80}}}}``.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+import numpy as np
+
+BRANDS = ["Apple", "Samsung", "Dell", "Sony", "HP", "Lenovo"]
+SEARCH_QUERIES = ["Apple", "Samsung", "Dell", "Sony", "HP", "Lenovo"]
+BENCH_USERNAME = "bench_user"
+BENCH_PASSWORD = "bench_password"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="In-process benchmark of the DayStore API")
+    parser.add_argument("--mongo-uri", help="benchmark against this mongod instead of mongomock-motor")
+    parser.add_argument("--mongo-db", default="daystore_bench", help="database to seed (dropped first)")
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--actions", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per route")
+    parser.add_argument("--warmup", type=int, default=10, help="unmeasured requests per route")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--routes", help="comma-separated subset of route names")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="bench_output.json", help="where to write the JSON results")
+    parser.add_argument("--thresholds", help="JSON file with per-route p95_ms / p99_ms / min_rps limits")
+    parser.add_argument(
+        "--micro", action="store_true", help="only compare response serialization paths, no routing or Mongo"
+    )
+    return parser.parse_args()
+
+
+def configure_backend(args: argparse.Namespace) -> str:
+    """Point the app at the chosen Mongo; must run before ``app`` is imported."""
+    os.environ["MONGO_DB"] = args.mongo_db
+    # keep background work from competing with the measured requests
+    os.environ.setdefault("CATALOG_REFRESH_SECONDS", "3600")
+    os.environ.setdefault("POPULARITY_COMPACT_SECONDS", "0")
+    os.environ.setdefault("NEIGHBORS_RELOAD_SECONDS", "0")
+    os.environ.setdefault("ROLLUP_INTERVAL_SECONDS", "0")
+    if args.mongo_uri:
+        os.environ["MONGO_URI"] = args.mongo_uri
+        return "mongod"
+
+    try:
+        import mongomock.collection
+        import mongomock_motor
+        import motor.motor_asyncio
+    except ImportError:
+        sys.exit("mongomock-motor is not installed; pip install -r requirements-dev.txt or pass --mongo-uri")
+
+    motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+
+    # pymongo >= 4.11 passes sort= to bulk update/replace ops, which
+    # mongomock's BulkOperationBuilder does not accept yet
+    builder = mongomock.collection.BulkOperationBuilder
+    for name in ("add_update", "add_replace"):
+        orig = getattr(builder, name)
+
+        def patched(self, *a, _orig=orig, sort=None, **kw):
+            return _orig(self, *a, **kw)
+
+        setattr(builder, name, patched)
+    return "mongomock"
+
+
+async def seed(args: argparse.Namespace) -> None:
+    from bson import ObjectId
+
+    from app.core.db import actions_coll, client, products_coll, users_coll
+    from app.core.security import hash_password_async
+    from app.models import ActionEnum, Category
+
+    await client.drop_database(args.mongo_db)
+    rng = random.Random(args.seed)
+    categories = [c.value for c in Category]
+
+    products = [
+        {
+            "_id": ObjectId(),
+            "brand": (brand := rng.choice(BRANDS)),
+            "model": f"{brand} {rng.choice(['Pro', 'Air', 'Max', 'Lite', 'Mini'])} {i}",
+            "price": rng.randint(10, 3000),
+            "category": rng.choice(categories),
+        }
+        for i in range(args.products)
+    ]
+    if products:
+        await products_coll.insert_many(products)
+
+    # every synthetic user shares one hash; only the bench user ever logs in
+    password = await hash_password_async(BENCH_PASSWORD)
+    users = [{"username": BENCH_USERNAME, "password": password, "created_at": datetime.utcnow()}]
+    users += [{"username": f"bench_{i}", "password": password, "created_at": datetime.utcnow()} for i in range(args.users)]
+    res = await users_coll.insert_many(users)
+    user_ids = [str(_id) for _id in res.inserted_ids]
+
+    weights = [70, 20, 10]
+    actions = [a.value for a in ActionEnum]
+    start = datetime.utcnow() - timedelta(days=30)
+    batch = []
+    for _ in range(args.actions):
+        p = rng.choice(products) if products else None
+        batch.append({
+            "userId": rng.choice(user_ids),
+            "productId": str(p["_id"]) if p else None,
+            "category": p["category"] if p else None,
+            "action": rng.choices(actions, weights)[0],
+            "timestamp": start + timedelta(seconds=rng.randint(0, 30 * 86400)),
+        })
+        if len(batch) >= 5000:
+            await actions_coll.insert_many(batch)
+            batch = []
+    if batch:
+        await actions_coll.insert_many(batch)
+
+
+Request = Callable[[object, random.Random], Awaitable[Tuple[int, bool]]]
+
+
+def build_routes(product_ids: List[str], auth: Dict[str, str]) -> Dict[str, Request]:
+    """One request factory per Locust task; each returns (status, ok)."""
+    categories = ["LAPTOP", "PHONE", "HEADPHONE", "SMART_WATCH", "CAMERA", "PC"]
+
+    async def list_products(c, rng):
+        r = await c.get("/api/v1/products")
+        return r.status_code, r.status_code == 200 and bool(r.json().get("items"))
+
+    async def search(c, rng):
+        r = await c.get("/api/v1/search", params={"q": rng.choice(SEARCH_QUERIES)})
+        return r.status_code, r.status_code == 200
+
+    async def by_category(c, rng):
+        selected = ",".join(rng.sample(categories, rng.randint(1, 2)))
+        r = await c.get("/api/v1/products/by-category", params={"category": selected})
+        return r.status_code, r.status_code == 200
+
+    async def product_details(c, rng):
+        r = await c.get(f"/api/v1/products/{rng.choice(product_ids)}", headers=auth)
+        return r.status_code, r.status_code == 200
+
+    async def like(c, rng):
+        r = await c.post(f"/api/v1/products/{rng.choice(product_ids)}/like", headers=auth)
+        return r.status_code, r.status_code in (200, 400)  # 400 if already liked
+
+    async def recommendation(c, rng):
+        r = await c.get("/api/v1/users/me/recommendation", params={"limit": 10}, headers=auth)
+        return r.status_code, r.status_code == 200
+
+    async def me(c, rng):
+        r = await c.get("/api/v1/users/me", headers=auth)
+        return r.status_code, r.status_code == 200
+
+    async def buy(c, rng):
+        r = await c.post(f"/api/v1/products/{rng.choice(product_ids)}/buy", headers=auth)
+        return r.status_code, r.status_code == 200
+
+    async def purchases(c, rng):
+        r = await c.get("/api/v1/users/me/purchases", headers=auth)
+        return r.status_code, r.status_code == 200
+
+    async def history(c, rng):
+        r = await c.get("/api/v1/users/me/history", headers=auth)
+        return r.status_code, r.status_code == 200
+
+    return {
+        "list_products": list_products,
+        "search": search,
+        "products_by_category": by_category,
+        "get_product": product_details,
+        "like_product": like,
+        "me_recommendation": recommendation,
+        "get_me": me,
+        "buy_product": buy,
+        "me_purchases": purchases,
+        "me_history": history,
+    }
+
+
+async def measure(client, fn: Request, n: int, warmup: int, concurrency: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    for _ in range(warmup):
+        await fn(client, rng)
+
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    remaining = n
+
+    async def worker() -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            t = time.perf_counter()
+            status, ok = await fn(client, rng)
+            latencies.append(time.perf_counter() - t)
+            if not ok:
+                errors[str(status)] = errors.get(str(status), 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    wall = time.perf_counter() - started
+
+    ms = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99]) if ms.size else (0.0, 0.0, 0.0)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "mean_ms": round(float(ms.mean()), 3) if ms.size else 0.0,
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(ms.max()), 3) if ms.size else 0.0,
+        "rps": round(len(latencies) / wall, 1) if wall > 0 else None,
+    }
+
+
+def serialization_micro(args: argparse.Namespace) -> Dict[str, dict]:
+    """Old vs current response serialization for list_products, search and me_history.
+
+    ``legacy`` replays what FastAPI did with the old handlers: per-document
+    Pydantic models, ``response_model`` dump + re-validate + serialize, then
+    stdlib ``json``. ``fast`` is the current path: snapshot payloads (or
+    trusted dicts) straight into orjson. Both must produce the same JSON.
+    """
+    import orjson
+    from bson import ObjectId
+    from fastapi.encoders import jsonable_encoder
+    from pydantic import TypeAdapter
+
+    from app.core.pagination import MAX_PAGE_SIZE
+    from app.models import ActionEnum, Category, ProductOut, UserActionOut
+    from app.routers.products import ProductsResponse
+    from app.services.catalog import CatalogSnapshot
+
+    rng = random.Random(args.seed)
+    categories = [c.value for c in Category]
+    docs = [
+        {
+            "_id": ObjectId(),
+            "brand": (brand := rng.choice(BRANDS)),
+            "model": f"{brand} {rng.choice(['Pro', 'Air', 'Max', 'Lite', 'Mini'])} {i}",
+            "price": rng.randint(10, 3000),
+            "category": rng.choice(categories),
+        }
+        for i in range(max(1, args.products))
+    ]
+    snap = CatalogSnapshot(docs, version=1)
+    page = snap.items[:MAX_PAGE_SIZE]
+    models = [ProductOut(**item) for item in page]  # what the old snapshot held
+    start = datetime.utcnow()
+    actions = [
+        {
+            "_id": ObjectId(),
+            "userId": "u1",
+            "productId": str((p := rng.choice(docs))["_id"]),
+            "category": p["category"],
+            "action": rng.choice([a.value for a in ActionEnum]),
+            "timestamp": start - timedelta(seconds=i, milliseconds=rng.randint(0, 999)),
+        }
+        for i in range(500)
+    ]
+
+    def stdlib(content) -> bytes:
+        # starlette's JSONResponse.render
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+    def via_response_model(adapter: TypeAdapter, content) -> bytes:
+        value = adapter.validate_python(content)
+        return stdlib(adapter.dump_python(value, mode="json"))
+
+    page_adapter = TypeAdapter(ProductsResponse)
+    history_adapter = TypeAdapter(List[UserActionOut])
+
+    cases = {
+        "list_products": (
+            lambda: via_response_model(
+                page_adapter,
+                ProductsResponse(count=len(models), items=models, next_cursor=None).model_dump(by_alias=True),
+            ),
+            lambda: orjson.dumps({"count": len(page), "items": snap.select(range(len(page))), "next_cursor": None}),
+        ),
+        "search": (
+            lambda: stdlib(jsonable_encoder({"count": 200, "total": len(snap), "offset": 0, "items": page[:200]})),
+            lambda: orjson.dumps({"count": 200, "total": len(snap), "offset": 0, "items": page[:200]}),
+        ),
+        "me_history": (
+            lambda: via_response_model(
+                history_adapter,
+                [
+                    UserActionOut(
+                        id=str(d.get("_id")),
+                        userId=d["userId"],
+                        action=d["action"],
+                        productId=d.get("productId"),
+                        category=d.get("category"),
+                        timestamp=d.get("timestamp", start),
+                    ).model_dump(by_alias=True)
+                    for d in actions
+                ],
+            ),
+            lambda: orjson.dumps([
+                {
+                    "id": str(d.get("_id")),
+                    "userId": d["userId"],
+                    "action": d["action"],
+                    "productId": d.get("productId"),
+                    "category": d.get("category"),
+                    "timestamp": d.get("timestamp", start),
+                }
+                for d in actions
+            ]),
+        ),
+    }
+
+    results = {}
+    for name, (legacy, fast) in cases.items():
+        row = {"same_output": json.loads(legacy()) == json.loads(fast())}
+        for label, fn in (("legacy", legacy), ("fast", fast)):
+            fn()
+            t = time.perf_counter()
+            for _ in range(args.requests):
+                fn()
+            row[f"{label}_ms"] = round((time.perf_counter() - t) * 1000 / args.requests, 4)
+        row["speedup"] = round(row["legacy_ms"] / row["fast_ms"], 2) if row["fast_ms"] else None
+        results[name] = row
+        print(
+            f"{name:22s} legacy={row['legacy_ms']:8.3f}ms fast={row['fast_ms']:8.3f}ms "
+            f"x{row['speedup']} same_output={row['same_output']}"
+        )
+    return results
+
+
+def check_thresholds(results: Dict[str, dict], thresholds: Dict[str, dict]) -> List[str]:
+    failures = []
+    for route, limits in thresholds.items():
+        res = results.get(route)
+        if res is None:
+            continue
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if key in limits and res[key] > limits[key]:
+                failures.append(f"{route}: {key} {res[key]} > {limits[key]}")
+        if "min_rps" in limits and (res["rps"] or 0) < limits["min_rps"]:
+            failures.append(f"{route}: rps {res['rps']} < {limits['min_rps']}")
+        if res["errors"] and not limits.get("allow_errors", False):
+            failures.append(f"{route}: unexpected responses {res['errors']}")
+    return failures
+
+
+async def run(args: argparse.Namespace, backend: str) -> dict:
+    import httpx
+
+    from app.main import app
+
+    t = time.perf_counter()
+    await seed(args)
+    seed_seconds = time.perf_counter() - t
+
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            r = await client.get("/api/v1/products", params={"limit": 1000})
+            product_ids = [p["id"] for p in r.json()["items"]]
+            token = base64.b64encode(f"{BENCH_USERNAME}:{BENCH_PASSWORD}".encode()).decode()
+            routes = build_routes(product_ids, {"Authorization": f"Basic {token}"})
+            if args.routes:
+                wanted = {name.strip() for name in args.routes.split(",")}
+                unknown = wanted - routes.keys()
+                if unknown:
+                    sys.exit(f"unknown routes: {', '.join(sorted(unknown))}; known: {', '.join(routes)}")
+                routes = {name: fn for name, fn in routes.items() if name in wanted}
+
+            results = {}
+            for i, (name, fn) in enumerate(routes.items()):
+                results[name] = await measure(client, fn, args.requests, args.warmup, args.concurrency, args.seed + i)
+                r = results[name]
+                print(
+                    f"{name:22s} p50={r['p50_ms']:8.2f}ms p95={r['p95_ms']:8.2f}ms "
+                    f"p99={r['p99_ms']:8.2f}ms rps={r['rps']:8.1f} errors={sum(r['errors'].values())}"
+                )
+    finally:
+        await app.router.shutdown()
+
+    return {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(),
+            "backend": backend,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "products": args.products,
+            "users": args.users,
+            "actions": args.actions,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "seed_seconds": round(seed_seconds, 3),
+        },
+        "routes": results,
+    }
+
+
+def main() -> None:
+    args = parse_args()
+    backend = configure_backend(args)
+    if args.micro:
+        report = {
+            "meta": {
+                "created_at": datetime.utcnow().isoformat(),
+                "python": platform.python_version(),
+                "products": args.products,
+                "requests": args.requests,
+            },
+            "serialization": serialization_micro(args),
+        }
+        report["failures"] = [
+            f"{name}: fast path output differs" for name, row in report["serialization"].items() if not row["same_output"]
+        ]
+    else:
+        report = asyncio.run(run(args, backend))
+
+    if args.thresholds and not args.micro:
+        with open(args.thresholds, encoding="utf-8") as f:
+            thresholds = json.load(f)
+        limits = thresholds.get(backend, {}).get("routes", {})
+        if not limits:
+            print(f"no thresholds for backend {backend!r} in {args.thresholds}")
+        report["failures"] = check_thresholds(report["routes"], limits)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.out}")
+
+    for failure in report.get("failures", []):
+        print(f"REGRESSION {failure}")
+    if report.get("failures"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""Offline job: item-item co-occurrence neighbours for /products/{id}/similar.
+
+Streams ``user_actions`` ordered by user, turns every chunk of users into a
+sparse user x item matrix ``U`` (cell = summed action weight) and folds
+``U.T @ U`` into the running item x item co-occurrence matrix, so memory is
+bounded by the chunk plus the co-occurrence matrix itself. Similarity is
+cosine over those weighted vectors; the top-M neighbours per product are
+written to ``product_neighbors`` and picked up by the API on its next reload.
+
+    python -m item_neighbors --top-m 50 --chunk-users 5000
+    python -m item_neighbors --snapshot snapshots/today
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+from pymongo import ReplaceOne
+from scipy import sparse
+
+from actions_snapshot import MISSING, Snapshot
+from app.core.db import actions_coll
+from app.services.neighbors import neighbors_coll, neighbors_meta_coll
+from app.services.profiles import action_weight
+
+
+class CooccurrenceBuilder:
+    def __init__(self, chunk_users: int):
+        self.chunk_users = max(1, chunk_users)
+        self.item_ids: List[str] = []
+        self.item_index: Dict[str, int] = {}
+        self.matrix: Optional[sparse.csr_matrix] = None
+        self.users = 0
+        self.actions = 0
+        self._rows: List[int] = []
+        self._cols: List[int] = []
+        self._vals: List[float] = []
+        self._chunk_users = 0
+
+    def _item(self, pid: str) -> int:
+        idx = self.item_index.get(pid)
+        if idx is None:
+            idx = self.item_index[pid] = len(self.item_ids)
+            self.item_ids.append(pid)
+        return idx
+
+    def add_user(self, weights: Dict[str, float]) -> None:
+        row = self._chunk_users
+        for pid, w in weights.items():
+            if w > 0:
+                self._rows.append(row)
+                self._cols.append(self._item(pid))
+                self._vals.append(w)
+        self._chunk_users += 1
+        self.users += 1
+        if self._chunk_users >= self.chunk_users:
+            self.fold()
+
+    def fold(self) -> None:
+        if not self._vals:
+            self._chunk_users = 0
+            return
+        u = sparse.csr_matrix(
+            (np.asarray(self._vals, dtype=np.float64), (self._rows, self._cols)),
+            shape=(self._chunk_users, len(self.item_ids)),
+        )
+        self._accumulate(u)
+        self._rows, self._cols, self._vals = [], [], []
+        self._chunk_users = 0
+
+    def _accumulate(self, u: sparse.csr_matrix) -> None:
+        n = len(self.item_ids)
+        chunk = (u.T @ u).tocsr()
+        if self.matrix is None:
+            self.matrix = chunk
+        else:
+            self.matrix.resize((n, n))
+            self.matrix = self.matrix + chunk
+
+    def add_snapshot(self, snap: Snapshot) -> None:
+        """Fold a snapshot in directly from its code columns, chunk by chunk."""
+        self.item_ids = snap.products.tolist()
+        self.item_index = {pid: i for i, pid in enumerate(self.item_ids)}
+        # action code -1 (unknown) lands on the trailing zero
+        weights = np.array([action_weight(a) for a in snap.actions] + [0], dtype=np.float64)
+        bounds = snap.user_bounds()
+        cuts = bounds[:: self.chunk_users].tolist()
+        if cuts[-1] != bounds[-1]:
+            cuts.append(int(bounds[-1]))
+        for start, end in zip(cuts[:-1], cuts[1:]):
+            users = np.asarray(snap.user[start:end])
+            cols = np.asarray(snap.product[start:end])
+            vals = weights[snap.action[start:end]]
+            keep = (cols != MISSING) & (vals > 0)
+            rows = users[keep] - users[0]
+            u = sparse.csr_matrix(
+                (vals[keep], (rows, cols[keep])),
+                shape=(int(users[-1] - users[0]) + 1, len(self.item_ids)),
+            )
+            self._accumulate(u)
+        self.users += len(bounds) - 1
+        self.actions += len(snap)
+
+    def top_neighbors(self, top_m: int) -> Dict[str, List[dict]]:
+        self.fold()
+        if self.matrix is None:
+            return {}
+        c = self.matrix
+        c.sum_duplicates()
+        norms = np.sqrt(c.diagonal())
+        # ties are broken by product id, so the result does not depend on
+        # the order items were first seen in
+        ids = np.array(self.item_ids)
+        out: Dict[str, List[dict]] = {}
+        for i in range(c.shape[0]):
+            start, end = c.indptr[i], c.indptr[i + 1]
+            cols = c.indices[start:end]
+            keep = cols != i
+            cols = cols[keep]
+            if cols.size == 0:
+                continue
+            sims = c.data[start:end][keep] / (norms[i] * norms[cols])
+            order = np.lexsort((ids[cols], -sims))[:top_m]
+            out[self.item_ids[i]] = [
+                {"id": self.item_ids[j], "score": round(float(s), 6)}
+                for j, s in zip(cols[order], sims[order])
+            ]
+        return out
+
+
+async def _stream_mongo(builder: CooccurrenceBuilder, batch_size: int) -> None:
+    cursor = actions_coll.find(
+        {"productId": {"$ne": None}},
+        {"_id": 0, "userId": 1, "productId": 1, "action": 1},
+    ).sort("userId", 1).batch_size(batch_size)
+
+    current_user = None
+    weights: Dict[str, float] = {}
+    async for a in cursor:
+        builder.actions += 1
+        uid = a.get("userId")
+        if uid != current_user:
+            if weights:
+                builder.add_user(weights)
+            current_user, weights = uid, {}
+        if uid:
+            pid = a["productId"]
+            weights[pid] = weights.get(pid, 0.0) + action_weight(a.get("action"))
+    if weights:
+        builder.add_user(weights)
+
+
+async def build(chunk_users: int, top_m: int, batch_size: int, snapshot: Optional[str] = None) -> dict:
+    started = time.perf_counter()
+    builder = CooccurrenceBuilder(chunk_users)
+    if snapshot:
+        builder.add_snapshot(Snapshot(snapshot))
+    else:
+        await _stream_mongo(builder, batch_size)
+
+    neighbors = builder.top_neighbors(top_m)
+
+    built_at = datetime.utcnow()
+    ops = []
+    for pid, items in neighbors.items():
+        ops.append(ReplaceOne({"_id": pid}, {"neighbors": items, "built_at": built_at}, upsert=True))
+        if len(ops) >= batch_size:
+            await neighbors_coll.bulk_write(ops, ordered=False)
+            ops = []
+    if ops:
+        await neighbors_coll.bulk_write(ops, ordered=False)
+    await neighbors_coll.delete_many({"built_at": {"$ne": built_at}})
+
+    report = {
+        "actions": builder.actions,
+        "users": builder.users,
+        "items": len(builder.item_ids),
+        "nnz": int(builder.matrix.nnz) if builder.matrix is not None else 0,
+        "products_with_neighbors": len(neighbors),
+        "top_m": top_m,
+        "source": snapshot or "mongo",
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+    }
+    await neighbors_meta_coll.replace_one(
+        {"_id": "product_neighbors"}, {"built_at": built_at, **report}, upsert=True
+    )
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top-m", type=int, default=50, help="neighbours kept per product")
+    parser.add_argument("--chunk-users", type=int, default=5000, help="users folded into the matrix at a time")
+    parser.add_argument("--batch-size", type=int, default=5000, help="cursor and bulk write batch size")
+    parser.add_argument("--snapshot", help="directory written by actions_snapshot; read instead of Mongo")
+    args = parser.parse_args()
+
+    report = asyncio.run(build(args.chunk_users, args.top_m, args.batch_size, args.snapshot))
+    for key, value in report.items():
+        print(f"{key:24s} {value}")
+
+
+if __name__ == "__main__":
+    main()
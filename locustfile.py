@@ -49,7 +49,7 @@ def on_test_start(environment, **kwargs):
         print(f"🔑 Auth токен создан")
 
         try:
-            response = requests.get(f"{BASE_URL}/api/v1/products", timeout=10)
+            response = requests.get(f"{BASE_URL}/api/v1/products?limit=1000", timeout=10)
             if response.status_code == 200:
                 data = response.json()
                 product_ids = [p["id"] for p in data.get("items", [])]
@@ -1,16 +1,28 @@
+import argparse
 import asyncio
-from collections import defaultdict, Counter
-from datetime import datetime
-import math
+from concurrent.futures import ProcessPoolExecutor
+import os
 import random
-from typing import Dict, List, Tuple, Set
+import time
+import zlib
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Set
 
+import numpy as np
+
+from actions_snapshot import Snapshot
 from app.core.db import products_coll, actions_coll
 from app.models import ActionEnum
+from app.services.neighbors import NeighborIndex
+from app.services.recommendation import ScoringModel, accumulate_scores, with_neighbor_scores
+from item_neighbors import CooccurrenceBuilder
 
 K = 10
 TRAIN_RATIO = 0.7
 MIN_ACTIONS_FOR_USER = 3
+CHUNK_USERS = 2000
+# same defaults as item_neighbors, for neighbours built from a snapshot
+NEIGHBORS_TOP_M = 50
+NEIGHBORS_CHUNK_USERS = 5000
 POSITIVE_ACTIONS = {ActionEnum.LIKE.value, ActionEnum.PURCHASE.value}
 
 def user_type(total_actions: int) -> str:
@@ -22,54 +34,50 @@ def user_type(total_actions: int) -> str:
     return "power"
 
 
-def weight(action: str) -> int:
-  if action == ActionEnum.VIEW.value:
-    return 1
-  if action == ActionEnum.LIKE.value:
-    return 3
-  if action == ActionEnum.PURCHASE.value:
-    return 5
-  return 0
+Neighbors = Dict[str, List[Tuple[str, float]]]
 
 
-def recommend_personal(user_train_actions: List[dict], products: List[dict], k: int) -> List[str]:
+def recommend_personal(
+  user_train_actions: List[dict], model: ScoringModel, k: int, neighbors: Optional[Neighbors] = None
+) -> List[str]:
   if not user_train_actions:
     return []
 
-  product_scores: Dict[str, float] = {}
-  category_scores: Dict[str, float] = {}
-
-  for a in user_train_actions:
-    w = weight(a.get("action"))
-    pid = a.get("productId")
-    cat = a.get("category")
-    if pid:
-      product_scores[pid] = product_scores.get(pid, 0.0) + w
-    if cat:
-      category_scores[cat] = category_scores.get(cat, 0.0) + w
-
-  scored: List[Tuple[float, str]] = []
-  for p in products:
-    pid = str(p["_id"])
-    base = product_scores.get(pid, 0.0)
-    cat = p.get("category")
-    base += 0.5 * category_scores.get(cat, 0.0)
-    if base <= 0:
-      continue
-    scored.append((base, pid))
+  # same scoring as /users/me/recommendation: profile plus item neighbours
+  product_scores, category_scores = accumulate_scores(user_train_actions)
+  product_scores = with_neighbor_scores(product_scores, neighbors or {})
+  return model.recommend(product_scores, category_scores, k)
+
+
+async def load_neighbors() -> Neighbors:
+  index = NeighborIndex(reload_seconds=0)
+  await index.load()
+  return index.neighbors
+
+
+def build_neighbors_from_snapshot(snap: Snapshot) -> Neighbors:
+  builder = CooccurrenceBuilder(NEIGHBORS_CHUNK_USERS)
+  builder.add_snapshot(snap)
+  return {
+    pid: [(n["id"], n["score"]) for n in items]
+    for pid, items in builder.top_neighbors(NEIGHBORS_TOP_M).items()
+  }
+
 
-  scored.sort(key=lambda x: x[0], reverse=True)
-  return [pid for _, pid in scored[:k]]
+async def build_global_popularity() -> List[str]:
+  pipeline = [
+    {"$match": {"action": {"$in": sorted(POSITIVE_ACTIONS)}, "productId": {"$nin": [None, ""]}}},
+    {"$group": {"_id": "$productId", "count": {"$sum": 1}}},
+    {"$sort": {"count": -1, "_id": 1}},
+  ]
+  return [row["_id"] async for row in actions_coll.aggregate(pipeline, allowDiskUse=True)]
 
 
-def build_global_popularity(actions: List[dict]) -> List[str]:
-  cnt = Counter()
-  for a in actions:
-    if a.get("action") in POSITIVE_ACTIONS:
-      pid = a.get("productId")
-      if pid:
-        cnt[pid] += 1
-  return [pid for pid, _ in cnt.most_common()]
+def build_global_popularity_from_snapshot(snap: Snapshot) -> List[str]:
+  counts = snap.positive_counts(POSITIVE_ACTIONS)
+  codes = np.flatnonzero(counts)
+  ids = np.asarray(snap.products[codes])
+  return ids[np.lexsort((ids, -counts[codes]))].tolist()
 
 
 def recommend_popular(global_popular: List[str], banned: Set[str], k: int) -> List[str]:
@@ -83,11 +91,11 @@ def recommend_popular(global_popular: List[str], banned: Set[str], k: int) -> Li
   return result
 
 
-def recommend_random(all_product_ids: List[str], banned: Set[str], k: int) -> List[str]:
+def recommend_random(all_product_ids: List[str], banned: Set[str], k: int, rng: random.Random) -> List[str]:
   candidates = [pid for pid in all_product_ids if pid not in banned]
   if len(candidates) <= k:
     return candidates
-  return random.sample(candidates, k)
+  return rng.sample(candidates, k)
 
 def precision_recall_f1(recommended: List[str], relevant: Set[str]) -> Tuple[float, float, float]:
   if not recommended:
@@ -109,121 +117,201 @@ def precision_recall_f1(recommended: List[str], relevant: Set[str]) -> Tuple[flo
   return precision, recall, f1
 
 
-async def main():
-  print("=== DayStore Recommendation Quality Test ===")
+ALGOS = ["personal", "popular", "random"]
+SEGMENTS = ["all", "cold", "casual", "power"]
 
-  actions = await actions_coll.find({}).to_list(length=None)
-  products = await products_coll.find({}).to_list(length=None)
+# (productId, category, action); actions are kept as small tuples on the way
+# to the workers instead of full Mongo documents
+Act = Tuple[Optional[str], Optional[str], Optional[str]]
 
-  if not actions or not products:
-    print("Нет данных (actions или products пусты). Нечего оценивать.")
-    return
+# per-process state, set once by _init_worker
+_model: Optional[ScoringModel] = None
+_global_popular: List[str] = []
+_neighbors: Neighbors = {}
+_k = K
 
-  print(f"Всего действий: {len(actions)}")
-  print(f"Всего товаров:  {len(products)}")
 
-  by_user: Dict[str, List[dict]] = defaultdict(list)
-  for a in actions:
-    uid = a.get("userId")
-    if uid:
-      by_user[uid].append(a)
+def empty_stats() -> Dict[str, Dict[str, Dict[str, float]]]:
+  return {
+    alg: {seg: {"prec_sum": 0.0, "rec_sum": 0.0, "f1_sum": 0.0, "users": 0} for seg in SEGMENTS}
+    for alg in ALGOS
+  }
 
-  all_product_ids = [str(p["_id"]) for p in products]
 
-  global_popular = build_global_popularity(actions)
+def merge_stats(into: dict, other: dict) -> None:
+  for alg, segs in other.items():
+    for seg, info in segs.items():
+      for key, value in info.items():
+        into[alg][seg][key] += value
 
-  algos = ["personal", "popular", "random"]
 
-  stats: Dict[str, Dict[str, Dict[str, float]]] = {
-    alg: {
-      "all":   {"prec_sum": 0.0, "rec_sum": 0.0, "f1_sum": 0.0, "users": 0},
-      "cold":  {"prec_sum": 0.0, "rec_sum": 0.0, "f1_sum": 0.0, "users": 0},
-      "casual":{"prec_sum": 0.0, "rec_sum": 0.0, "f1_sum": 0.0, "users": 0},
-      "power": {"prec_sum": 0.0, "rec_sum": 0.0, "f1_sum": 0.0, "users": 0},
-    }
-    for alg in algos
-  }
+def _init_worker(
+  product_ids: List[str], categories: List[Optional[str]], global_popular: List[str], neighbors: Neighbors, k: int
+) -> None:
+  global _model, _global_popular, _neighbors, _k
+  _model = ScoringModel(product_ids, categories)
+  _global_popular = global_popular
+  _neighbors = neighbors
+  _k = k
 
-  random.seed(42)
 
-  processed_users = 0
+def _user_rng(user_id: str) -> random.Random:
+  # seeded per user so the random baseline does not depend on how users
+  # were split across workers
+  return random.Random(zlib.crc32(f"42:{user_id}".encode("utf-8")))
 
-  for user_id, acts in by_user.items():
-    def get_ts(a):
-      ts = a.get("timestamp")
-      if isinstance(ts, datetime):
-        return ts
-      return datetime.min
 
-    acts_sorted = sorted(acts, key=get_ts)
+def evaluate_chunk(users: List[Tuple[str, List[Act]]]) -> Tuple[dict, int]:
+  """Evaluate a chunk of users whose actions are already in time order."""
+  stats = empty_stats()
+  processed = 0
 
-    if len(acts_sorted) < MIN_ACTIONS_FOR_USER:
+  for user_id, acts in users:
+    if len(acts) < MIN_ACTIONS_FOR_USER:
       continue
 
-    processed_users += 1
+    processed += 1
 
-    split_idx = max(1, int(len(acts_sorted) * TRAIN_RATIO))
-    train_actions = acts_sorted[:split_idx]
-    test_actions = acts_sorted[split_idx:]
+    split_idx = max(1, int(len(acts) * TRAIN_RATIO))
+    train_acts = acts[:split_idx]
+    test_acts = acts[split_idx:]
 
-    if not test_actions:
+    if not test_acts:
       continue
 
-    relevant: Set[str] = set()
-    for a in test_actions:
-      if a.get("action") in POSITIVE_ACTIONS:
-        pid = a.get("productId")
-        if pid:
-          relevant.add(pid)
-
+    relevant: Set[str] = {pid for pid, _, action in test_acts if pid and action in POSITIVE_ACTIONS}
     if not relevant:
       continue
 
-    user_seen: Set[str] = set()
-    for a in train_actions + test_actions:
-      pid = a.get("productId")
-      if pid:
-        user_seen.add(pid)
-
-    utype = user_type(len(acts_sorted))
-
-    rec_personal = recommend_personal(train_actions, products, K)
-    p, r, f1 = precision_recall_f1(rec_personal, relevant)
-    for seg in ["all", utype]:
-      stats["personal"][seg]["prec_sum"] += p
-      stats["personal"][seg]["rec_sum"] += r
-      stats["personal"][seg]["f1_sum"] += f1
-      stats["personal"][seg]["users"] += 1
-
-    rec_popular = recommend_popular(global_popular, user_seen, K)
-    p, r, f1 = precision_recall_f1(rec_popular, relevant)
-    for seg in ["all", utype]:
-      stats["popular"][seg]["prec_sum"] += p
-      stats["popular"][seg]["rec_sum"] += r
-      stats["popular"][seg]["f1_sum"] += f1
-      stats["popular"][seg]["users"] += 1
-
-    rec_random = recommend_random(all_product_ids, user_seen, K)
-    p, r, f1 = precision_recall_f1(rec_random, relevant)
-    for seg in ["all", utype]:
-      stats["random"][seg]["prec_sum"] += p
-      stats["random"][seg]["rec_sum"] += r
-      stats["random"][seg]["f1_sum"] += f1
-      stats["random"][seg]["users"] += 1
-
-  if processed_users == 0:
-    print("Недостаточно пользователей с действиями для оценки.")
-    return
+    user_seen: Set[str] = {pid for pid, _, _ in acts if pid}
+    utype = user_type(len(acts))
 
+    train_actions = [{"productId": pid, "category": cat, "action": action} for pid, cat, action in train_acts]
+    recs = {
+      "personal": recommend_personal(train_actions, _model, _k, _neighbors),
+      "popular": recommend_popular(_global_popular, user_seen, _k),
+      "random": recommend_random(_model.product_ids, user_seen, _k, _user_rng(user_id)),
+    }
+    for alg, recommended in recs.items():
+      p, r, f1 = precision_recall_f1(recommended, relevant)
+      for seg in ["all", utype]:
+        stats[alg][seg]["prec_sum"] += p
+        stats[alg][seg]["rec_sum"] += r
+        stats[alg][seg]["f1_sum"] += f1
+        stats[alg][seg]["users"] += 1
+
+  return stats, processed
+
+
+def _sampled(user_id: str, sample: float) -> bool:
+  if sample >= 1.0:
+    return True
+  return zlib.crc32(user_id.encode("utf-8")) / 0xFFFFFFFF < sample
+
+
+async def iter_users_from_mongo(batch_size: int = 10000) -> AsyncIterator[Tuple[str, List[Act]]]:
+  """Yield ``(userId, actions)`` per user, oldest action first.
+
+  Walks the (userId, timestamp desc) index so Mongo never has to sort the
+  whole log, and reverses each user's actions on the way out.
+  """
+  cursor = actions_coll.find(
+    {"userId": {"$nin": [None, ""]}},
+    {"_id": 0, "userId": 1, "productId": 1, "category": 1, "action": 1},
+  ).sort([("userId", 1), ("timestamp", -1)]).batch_size(batch_size)
+
+  current = None
+  acts: List[Act] = []
+  async for a in cursor:
+    uid = a["userId"]
+    if uid != current:
+      if acts:
+        acts.reverse()
+        yield current, acts
+      current, acts = uid, []
+    acts.append((a.get("productId"), a.get("category"), a.get("action")))
+  if acts:
+    acts.reverse()
+    yield current, acts
+
+
+async def iter_users_from_snapshot(snap: Snapshot) -> AsyncIterator[Tuple[str, List[Act]]]:
+  for user in snap.iter_users():
+    yield user
+
+
+async def evaluate(
+  users: AsyncIterator[Tuple[str, List[Act]]],
+  init_args: tuple,
+  workers: int,
+  sample: float,
+  chunk_users: int = CHUNK_USERS,
+) -> Tuple[dict, int, int, int]:
+  """Fan user chunks out to ``workers`` processes and merge their aggregates.
+
+  At most ``2 * workers`` chunks are in flight, so memory stays bounded by
+  the chunk size rather than by the size of the action log.
+  """
+  stats = empty_stats()
+  processed = 0
+  seen_users = 0
+  seen_actions = 0
+
+  loop = asyncio.get_running_loop()
+  pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=init_args) if workers > 1 else None
+  if pool is None:
+    _init_worker(*init_args)
+  pending: Set[asyncio.Future] = set()
+
+  async def collect(wait_all: bool) -> None:
+    nonlocal processed, pending
+    done, pending = await asyncio.wait(pending, return_when=asyncio.ALL_COMPLETED if wait_all else asyncio.FIRST_COMPLETED)
+    for fut in done:
+      chunk_stats, chunk_processed = fut.result()
+      merge_stats(stats, chunk_stats)
+      processed += chunk_processed
+
+  def submit(chunk: List[Tuple[str, List[Act]]]) -> None:
+    nonlocal processed
+    if pool is None:
+      chunk_stats, chunk_processed = evaluate_chunk(chunk)
+      merge_stats(stats, chunk_stats)
+      processed += chunk_processed
+    else:
+      pending.add(loop.run_in_executor(pool, evaluate_chunk, chunk))
+
+  try:
+    chunk: List[Tuple[str, List[Act]]] = []
+    async for user_id, acts in users:
+      seen_users += 1
+      seen_actions += len(acts)
+      if not _sampled(user_id, sample):
+        continue
+      chunk.append((user_id, acts))
+      if len(chunk) >= chunk_users:
+        submit(chunk)
+        chunk = []
+        if len(pending) >= 2 * workers:
+          await collect(wait_all=False)
+    if chunk:
+      submit(chunk)
+    if pending:
+      await collect(wait_all=True)
+  finally:
+    if pool is not None:
+      pool.shutdown(cancel_futures=True)
+
+  return stats, processed, seen_users, seen_actions
+
+
+def print_report(stats: dict, processed_users: int, k: int) -> None:
   print(f"\nПользователей, вошедших в оценку: {processed_users}")
-  print(f"K = {K}, train_ratio = {TRAIN_RATIO}, MIN_ACTIONS_FOR_USER = {MIN_ACTIONS_FOR_USER}")
-
-  segments = ["all", "cold", "casual", "power"]
+  print(f"K = {k}, train_ratio = {TRAIN_RATIO}, MIN_ACTIONS_FOR_USER = {MIN_ACTIONS_FOR_USER}")
 
   print("\n=== Результаты (средние Precision@K, Recall@K, F1@K) ===\n")
-  for seg in segments:
+  for seg in SEGMENTS:
     print(f"--- Segment: {seg} ---")
-    for alg in algos:
+    for alg in ALGOS:
       info = stats[alg][seg]
       n = info["users"]
       if n == 0:
@@ -235,5 +323,71 @@ async def main():
       print(f"  {alg:8s}: P={avg_p:.3f}, R={avg_r:.3f}, F1={avg_f1:.3f}  (users={n})")
     print()
 
+
+async def main(workers: int = 1, k: int = K, sample: float = 1.0, snapshot: Optional[str] = None):
+  print("=== DayStore Recommendation Quality Test ===")
+  timings: Dict[str, float] = {}
+
+  t = time.perf_counter()
+  snap = Snapshot(snapshot) if snapshot else None
+  if snap is not None:
+    product_ids, categories = snap.catalog()
+  else:
+    products = await products_coll.find({}, {"category": 1}).to_list(length=None)
+    product_ids, categories = [str(p["_id"]) for p in products], [p.get("category") for p in products]
+  timings["products"] = time.perf_counter() - t
+
+  if not product_ids:
+    print("Нет данных (actions или products пусты). Нечего оценивать.")
+    return
+
+  t = time.perf_counter()
+  global_popular = build_global_popularity_from_snapshot(snap) if snap is not None else await build_global_popularity()
+  timings["popularity"] = time.perf_counter() - t
+
+  t = time.perf_counter()
+  neighbors = build_neighbors_from_snapshot(snap) if snap is not None else await load_neighbors()
+  timings["neighbors"] = time.perf_counter() - t
+
+  init_args = (product_ids, categories, global_popular, neighbors, k)
+
+  t = time.perf_counter()
+  users_iter = iter_users_from_snapshot(snap) if snap is not None else iter_users_from_mongo()
+  stats, processed_users, users, actions = await evaluate(users_iter, init_args, workers, sample)
+  timings["evaluate"] = time.perf_counter() - t
+
+  if not actions:
+    print("Нет данных (actions или products пусты). Нечего оценивать.")
+    return
+
+  print(f"Всего действий: {actions}")
+  print(f"Всего товаров:  {len(product_ids)}")
+
+  if processed_users == 0:
+    print("Недостаточно пользователей с действиями для оценки.")
+  else:
+    print_report(stats, processed_users, k)
+
+  print("=== Время ===")
+  for name, seconds in timings.items():
+    print(f"  {name:10s}: {seconds:.2f}s")
+  evaluate_s = timings["evaluate"] or 1e-9
+  source = snapshot or "mongo"
+  print(f"  source={source}, workers={workers}, sample={sample}, users={users}: {users / evaluate_s:.0f} users/s, {actions / evaluate_s:.0f} actions/s")
+
+
+def parse_args():
+  parser = argparse.ArgumentParser(description="Offline evaluation of recommendation quality")
+  parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="evaluator processes (1 = in-process)")
+  parser.add_argument("--k", type=int, default=K, help="recommendations per user")
+  parser.add_argument("--sample", type=float, default=1.0, help="fraction of users to evaluate, 0 < sample <= 1")
+  parser.add_argument("--snapshot", help="directory written by actions_snapshot; read instead of Mongo")
+  args = parser.parse_args()
+  if not 0 < args.sample <= 1:
+    parser.error("--sample must be in (0, 1]")
+  return args
+
+
 if __name__ == "__main__":
-  asyncio.run(main())
+  args = parse_args()
+  asyncio.run(main(workers=max(1, args.workers), k=args.k, sample=args.sample, snapshot=args.snapshot))
@@ -1,3 +1,5 @@
+import { fetchAllPages } from "./common.js";
+
 (function () {
 
   const out = (msg) => {
@@ -60,8 +62,7 @@
   async function loadProducts() {
     try {
       const useCache = getAuthToken() ? "false" : "true";
-      const data = await fetchJSON(`/api/v1/products?use_cache=${useCache}`);
-      renderProducts(data.items || []);
+      await fetchAllPages(`/api/v1/products?use_cache=${useCache}&limit=200`, renderProducts);
       updateControlsState();
     } catch (e) {
       out(e.message);
@@ -24,12 +24,15 @@ function render(){
 async function checkout(){
   const items = cartList(); if(!items.length) return out("Cart is empty");
   if(!getAuthToken()) return out("Login required (Account page)");
-  let ok=0, fail=0;
-  for(const it of items){
-    try{ await fetchJSON(`/api/v1/products/${it.id}/buy`, {method:"POST"}); ok++; }
-    catch(e){ fail++; out(`Error ${it.id}: ${e.message}`); }
-  }
-  out(`Purchased: ${ok}, errors: ${fail}`);
+  try{
+    const res = await fetchJSON(`/api/v1/users/me/checkout`, {
+      method:"POST",
+      headers:{"Content-Type":"application/json"},
+      body: JSON.stringify({ items: items.map(it=>({ productId: it.id, quantity: 1 })) }),
+    });
+    const failed = (res.items||[]).filter(r=>r.status !== "purchased").map(r=>r.productId);
+    out(`Purchased: ${res.purchased}, errors: ${res.failed}` + (failed.length ? ` (${failed.join(", ")})` : ""));
+  }catch(e){ out(`Checkout error: ${e.message}`); }
   render();
 }
 
@@ -1,4 +1,4 @@
-import { fetchJSON, out, reflectAuthStatus, getAuthToken, cartAdd } from "./common.js";
+import { fetchJSON, fetchAllPages, out, reflectAuthStatus, getAuthToken, cartAdd } from "./common.js";
 
 function escapeHtml(s) {
   return String(s ?? "")
@@ -80,8 +80,7 @@ async function reloadWithFilters() {
     let items = [];
 
     if (!q && !cats.length) {
-      const data = await fetchJSON(`/api/v1/products`);
-      items = Array.isArray(data) ? data : (data.items || []);
+      items = await fetchAllPages(`/api/v1/products?limit=200`, renderProducts);
     }
     else if (q && cats.length) {
       const data = await fetchJSON(`/api/v1/search?q=${encodeURIComponent(q)}`);
@@ -98,8 +97,10 @@ async function reloadWithFilters() {
     }
     else if (!q && cats.length) {
       const csv = cats.join(",");
-      const data = await fetchJSON(`/api/v1/products/by-category?category=${encodeURIComponent(csv)}`);
-      items = data.items || [];
+      items = await fetchAllPages(
+        `/api/v1/products/by-category?category=${encodeURIComponent(csv)}&limit=200`,
+        renderProducts
+      );
     }
 
     renderProducts(items);
@@ -53,6 +53,20 @@ export async function fetchJSON(url, opts = {}) {
   return ct.includes("application/json") ? r.json() : r.text();
 }
 
+export async function fetchAllPages(url, onPage) {
+  const sep = url.includes("?") ? "&" : "?";
+  let items = [];
+  let cursor = null;
+  do {
+    const pageUrl = cursor ? `${url}${sep}cursor=${encodeURIComponent(cursor)}` : url;
+    const data = await fetchJSON(pageUrl);
+    items = items.concat(data.items || []);
+    if (onPage) onPage(items);
+    cursor = data.next_cursor || null;
+  } while (cursor);
+  return items;
+}
+
 export function out(msg, id = "output") {
   const el = document.getElementById(id);
   if (!el) return;